@@ -0,0 +1,50 @@
+"""Times writing a large triangle mesh to a pbrt scene file as text and as a
+binary PLY file. Run from the repository root:
+
+  python -m benchmarks.meshes
+"""
+import argparse
+import numpy as np
+import os
+import tempfile
+import time
+
+import pyrene
+
+
+def grid_mesh(n):
+  # An n x n grid of points with 2 (n - 1)^2 triangles.
+  x, y = np.meshgrid(np.linspace(-1, 1, n), np.linspace(-1, 1, n))
+  points = np.column_stack([x.ravel(), y.ravel(), np.sin(3 * x * y).ravel()])
+  corners = np.arange(n * n).reshape(n, n)[:-1, :-1].ravel()
+  indices = np.concatenate([
+      np.column_stack([corners, corners + 1, corners + n + 1]),
+      np.column_stack([corners, corners + n + 1, corners + n])])
+  return pyrene.Mesh(points, indices)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--grid', type=int, default=708,
+                      help='points per side, 708 gives about 1M triangles')
+  args = parser.parse_args()
+
+  scene = pyrene.Scene()
+  scene.objects.append(grid_mesh(args.grid))
+  print('%d triangles' % len(scene.objects[0].indices))
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    scene_file = os.path.join(tmp_dir, 'scene.pbrt')
+    for name, ply_triangles in [('text', None), ('ply', 1)]:
+      renderer = pyrene.pbrt.PbrtRenderer(ply_triangles=ply_triangles)
+      start = time.perf_counter()
+      renderer.write_scene_file(scene, scene_file)
+      elapsed = time.perf_counter() - start
+      size = sum(os.path.getsize(os.path.join(tmp_dir, f))
+                 for f in os.listdir(tmp_dir)) / 2**20
+      print('%5s %8.3fs %8.1f MB' % (name, elapsed, size))
+      for f in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, f))
+
+
+if __name__ == '__main__':
+  main()
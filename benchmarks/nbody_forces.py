@@ -0,0 +1,99 @@
+"""Compares simulation steps per second of the per-particle loop that
+nbodies.World.simulate used with the blocked DirectForces, and with the
+Barnes-Hut approximation and its median relative error, and of both in a
+pool of processes. Run from the repository root:
+
+  python -m benchmarks.nbody_forces
+"""
+import argparse
+import numpy as np
+import os
+import time
+
+from nbody import BarnesHutForces, DirectForces, ParallelForces
+
+
+G = 1.0
+
+
+def loop_accelerations(points, masses):
+  # The loop nbodies.World.simulate ran every step.
+  n = len(points)
+  a = np.zeros((n, 3))
+  for i in range(n):
+    d = points - points[i]
+    d[i][0] = 1  # to avoid division by zero
+    numer = G * d * masses[:,np.newaxis]
+    denom = (np.linalg.norm(d, axis=1)**3)[:,np.newaxis]
+    a_per_point = numer / denom
+    a_per_point[i] = [0, 0, 0]
+    a[i] = np.sum(a_per_point, 0)
+  return a
+
+
+def steps_per_second(accelerations, points, masses, min_time):
+  steps = 0
+  start = time.perf_counter()
+  while True:
+    accelerations(points, masses)
+    steps += 1
+    elapsed = time.perf_counter() - start
+    if elapsed >= min_time:
+      return steps / elapsed
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--sizes', type=int, nargs='+',
+                      default=[100, 300, 1000, 3000, 10000])
+  parser.add_argument('--min-time', type=float, default=1.0,
+                      help='seconds to run each measurement for')
+  parser.add_argument('--theta', type=float, default=0.5,
+                      help='opening angle of the Barnes-Hut approximation')
+  parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                      help='size of the pool of the parallel solvers')
+  args = parser.parse_args()
+
+  forces = DirectForces(G)
+  tree_forces = BarnesHutForces(G, theta=args.theta)
+  print('%8s %12s %12s %12s %10s' % ('N', 'loop', 'blocked', 'barnes-hut',
+                                     'error'))
+  for n in args.sizes:
+    rng = np.random.RandomState(123)
+    points = rng.normal(scale=5, size=(n, 3))
+    masses = rng.random_sample(n)
+    loop = steps_per_second(loop_accelerations, points, masses, args.min_time)
+    blocked = steps_per_second(forces.accelerations, points, masses,
+                               args.min_time)
+    tree = steps_per_second(tree_forces.accelerations, points, masses,
+                            args.min_time)
+    exact = forces.accelerations(points, masses)
+    error = np.median(
+        np.linalg.norm(tree_forces.accelerations(points, masses) - exact,
+                       axis=1) / np.linalg.norm(exact, axis=1))
+    print('%8d %10.2f/s %10.2f/s %10.2f/s %10.2e' % (n, loop, blocked, tree,
+                                                    error))
+
+  print()
+  print('%d processes' % args.processes)
+  print('%8s %12s %12s' % ('N', 'blocked', 'barnes-hut'))
+  parallel = ParallelForces(forces, args.processes)
+  tree_parallel = ParallelForces(tree_forces, args.processes)
+  try:
+    for n in args.sizes:
+      rng = np.random.RandomState(123)
+      points = rng.normal(scale=5, size=(n, 3))
+      masses = rng.random_sample(n)
+      print('%8d %10.2f/s %10.2f/s' % (
+          n,
+          steps_per_second(parallel.accelerations, points, masses,
+                           args.min_time),
+          steps_per_second(tree_parallel.accelerations, points, masses,
+                           args.min_time)))
+  finally:
+    parallel.close()
+    tree_parallel.close()
+
+
+if __name__ == '__main__':
+  main()
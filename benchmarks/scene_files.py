@@ -0,0 +1,83 @@
+"""Times scene file generation for growing numbers of spheres.
+
+Compares writing every sphere on its own with the bulk path that writers use
+for runs of plain spheres, and with a SphereSet holding the same spheres. Run
+from the repository root:
+
+  python -m benchmarks.scene_files
+"""
+import argparse
+import numpy as np
+import os
+import tempfile
+import time
+
+import pyrene
+
+
+def make_scene(n, sphere_set=False):
+  np.random.seed(123)
+  scene = pyrene.Scene()
+  scene.camera = pyrene.Camera(loc=(0, -50, 0), to=(0, 0, 0))
+  scene.objects.append(pyrene.Sphere(
+      radius=1, light=pyrene.AreaLight(color=(1, 1, 1), power=1000)))
+  centers = np.random.normal(scale=5, size=(n, 3))
+  radii = 0.5 * np.random.random(n) + 0.5
+  if sphere_set:
+    scene.objects.append(pyrene.SphereSet(centers, radii))
+  else:
+    for center, radius in zip(centers, radii):
+      scene.objects.append(pyrene.Sphere(center=center, radius=radius))
+  return scene
+
+
+def write_one_by_one(renderer, scene, scene_file):
+  renderer._write_objects = lambda writer, objects: [
+      renderer._write_object(writer, obj) for obj in objects]
+  try:
+    renderer.write_scene_file(scene, scene_file)
+  finally:
+    del renderer._write_objects
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--renderer', default='pbrt', choices=['pbrt', 'lux'])
+  parser.add_argument('--max-spheres', type=int, default=1000000)
+  parser.add_argument('--max-one-by-one', type=int, default=100000,
+                      help='skip the slow path above this many spheres')
+  args = parser.parse_args()
+
+  if args.renderer == 'pbrt':
+    renderer = pyrene.pbrt.PbrtRenderer()
+  else:
+    renderer = pyrene.lux.LuxRenderer()
+  scene_file = tempfile.mkstemp()[1]
+  print('%10s %12s %12s %12s %10s' % (
+      'spheres', 'one by one', 'bulk', 'SphereSet', 'MB'))
+  n = 1000
+  try:
+    while n <= args.max_spheres:
+      scene = make_scene(n)
+      single = '-'
+      if n <= args.max_one_by_one:
+        start = time.perf_counter()
+        write_one_by_one(renderer, scene, scene_file)
+        single = '%.3fs' % (time.perf_counter() - start)
+      start = time.perf_counter()
+      renderer.write_scene_file(scene, scene_file)
+      bulk = time.perf_counter() - start
+      size = os.path.getsize(scene_file) / 2**20
+      scene = make_scene(n, sphere_set=True)
+      start = time.perf_counter()
+      renderer.write_scene_file(scene, scene_file)
+      sphere_set = time.perf_counter() - start
+      print('%10d %12s %11.3fs %11.3fs %10.1f' % (
+          n, single, bulk, sphere_set, size))
+      n *= 10
+  finally:
+    os.remove(scene_file)
+
+
+if __name__ == '__main__':
+  main()
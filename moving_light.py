@@ -1,6 +1,7 @@
 import logging
 import math
 import os
+import sys
 
 import pyrene
 
@@ -23,12 +24,22 @@ def main():
   config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pyrene.json')
   with open(config_path) as config_file:
     config = config_file.read()
+  # Each of the workers' pbrt processes gets its share of the cores.
+  workers = 4
   renderer = pyrene.create_renderer(
       renderer='pbrt', config=config, samples_per_pixel=20, width=1280,
-      height=720)
-  movie = pyrene.Movie(renderer=renderer, fps=60)
+      height=720, threads=max(1, os.cpu_count() // workers))
+  # With --preview, renders every 4th frame at a quarter of the resolution
+  # and a tenth of the samples to check the timing.
+  if '--preview' in sys.argv:
+    movie = pyrene.Movie(renderer=renderer, fps=60, workers=workers,
+                         output='out/lights_pbrt_preview.mp4',
+                         preview=pyrene.Preview())
+  else:
+    movie = pyrene.Movie(renderer=renderer, fps=60, workers=workers,
+                         output='out/lights_pbrt.mp4')
   movie.render_clip(0.0, 4.0, gen_frame)
-  movie.write('out/lights_pbrt.mp4')
+  movie.write()
 
 
 if __name__ == '__main__':
@@ -2,8 +2,11 @@ import logging
 import math
 import numpy as np
 import os
+import sys
 
 import pyrene
+from nbody import (BarnesHutForces, BlockTimesteps, DirectForces, Leapfrog,
+                   ParallelForces, Trajectory, Yoshida4)
 
 
 class Particle(object):
@@ -16,7 +19,7 @@ G = 1.0
 
 
 class World(object):
-  def __init__(self, nparticles=1000):
+  def __init__(self, nparticles=1000, forces=None, integrator=None):
     self.points = np.random.multivariate_normal(
         (0, 0, 0), np.identity(3) * 25, size=nparticles)
     self.velocities = np.random.multivariate_normal(
@@ -27,6 +30,12 @@ class World(object):
     self.visible = np.ones(nparticles, dtype=bool)
     self.t = 0
     self.n = nparticles
+    # Computes the accelerations of all particles, see nbody.
+    self.forces = forces or DirectForces(G)
+    # Advances the particles to the time of a frame, see nbody.integrators.
+    self.integrator = integrator or Leapfrog(dt=0.001)
+    # Accelerations at points, kept between frames by the integrator.
+    self.accelerations = None
 
   def add_particle(self, name, point, velocity, radius, mass, visible):
     self.name_to_id[name] = len(self.masses)
@@ -35,11 +44,15 @@ class World(object):
     self.radii = np.append(self.radii, [radius])
     self.masses = np.append(self.masses, [mass])
     self.visible = np.append(self.visible, [visible])
+    self.accelerations = None
     self.n += 1
 
-  def get_particle(self, name):
+  def get_particle(self, name, points=None):
+    # points, e.g. of a Trajectory frame, replace the current positions.
     i = self.name_to_id[name]
-    return Particle(self.points[i], self.radii[i])
+    if points is None:
+      points = self.points
+    return Particle(points[i], self.radii[i])
 
   def iter_visible(self):
     for i in range(len(self.masses)):
@@ -59,50 +72,76 @@ class World(object):
     # logging.debug('Masses: %s', self.masses)
     # World.acceleration(self.points)
     # return
-    dt = 0.001
-    while self.t < t1:
-      a = np.zeros((self.n, 3))
-      for i in range(self.n):
-        d = self.points - self.points[i]
-        d[i][0] = 1  # to avoid division by zero
-        numer = G * d * self.masses[:,np.newaxis]
-        denom = (np.linalg.norm(d, axis=1)**3)[:,np.newaxis]
-        a_per_point = numer / denom
-        a_per_point[i] = [0, 0, 0]
-        a[i] = np.sum(a_per_point, 0)
-      self.velocities += dt / 2 * a
-      self.points += dt * self.velocities
-      self.velocities += dt / 2 * a
-      self.t += dt
+    self.integrator.advance(self, t1)
 
     e = np.sum(self.masses * np.linalg.norm(self.velocities, axis=1)**2 / 2)
-    for i in range(self.n):
-      d = self.points - self.points[i]
-      d[i] = (1, 0, 0)
-      e -= G * self.masses[i] * np.sum(self.masses / np.linalg.norm(d, axis=1))
+    e += self.forces.potential_energy(self.points, self.masses)
     logging.info('Total energy: %f', e)
 
-
-def gen_frame(world, t):
+  def settings(self):
+    # What a precomputed trajectory of the world depends on besides the
+    # code: the shape of its points and the parameters of the force solver
+    # and integrator. Parallel forces give the same results as their solver.
+    forces = self.forces
+    if isinstance(forces, ParallelForces):
+      forces = forces.forces
+
+    def parameters(obj):
+      params = {key: value for key, value in vars(obj).items()
+                if isinstance(value, (bool, int, float, str))}
+      params['class'] = type(obj).__name__
+      return params
+
+    return {
+        'shape': list(self.points.shape),
+        'forces': parameters(forces),
+        'integrator': parameters(self.integrator),
+    }
+
+
+def gen_frame(world, t, trajectory=None):
+  # With a trajectory, reads the positions at t from it instead of
+  # simulating, and leaves world unchanged.
   logging.info('Generating frame for time %f', t)
-  world.simulate(t)
+  if trajectory is None:
+    world.simulate(t)
+    points = world.points
+  else:
+    points, _ = trajectory.frame(t)
   scene = pyrene.Scene()
-  camera = world.get_particle('camera')
+  camera = world.get_particle('camera', points)
   scene.camera = pyrene.Camera(loc=camera.location, to=(0, 0, 0))
-  sun = world.get_particle('sun')
+  sun = world.get_particle('sun', points)
   scene.objects.append(pyrene.Sphere(
       center=sun.location, radius=sun.radius,
       light=pyrene.AreaLight(color=(1, 1, 1), power=1000)))
-  for particle in world.iter_visible():
-    scene.objects.append(
-        pyrene.Sphere(center=particle.location, radius=particle.radius))
+  scene.objects.append(pyrene.SphereSet(
+      points[world.visible], world.radii[world.visible]))
   return scene
 
 
 def main():
   np.random.seed(123)
 
-  world = World(100)
+  # With --barnes-hut, approximates gravity with an octree, which scales to
+  # far more particles than the direct sum.
+  # With --parallel, computes the forces in a process per core.
+  # With --yoshida, integrates with fewer, fourth order, steps, and with
+  # --block-timesteps, shortens the steps of close encounters only, which
+  # needs softened forces.
+  integrator = Leapfrog(dt=0.001)
+  softening = 0.0
+  if '--yoshida' in sys.argv:
+    integrator = Yoshida4(dt=0.01)
+  if '--block-timesteps' in sys.argv:
+    softening = 0.05
+    integrator = BlockTimesteps(dt=0.01, softening=softening)
+  forces = DirectForces(G, softening=softening)
+  if '--barnes-hut' in sys.argv:
+    forces = BarnesHutForces(G, theta=0.5, softening=softening)
+  if '--parallel' in sys.argv:
+    forces = ParallelForces(forces)
+  world = World(100, forces=forces, integrator=integrator)
   world.add_particle('sun', (0, 0, 0), (0, 0, 0), 1, 10, False)
   world.add_particle('camera', (0, -50, 0), (2, 0, 0), 0, 1, False)
 
@@ -112,9 +151,26 @@ def main():
   renderer = pyrene.create_renderer(renderer='pbrt',
       config=config, samples_per_pixel=150, width=1280, height=720)
 
-  movie = pyrene.Movie(renderer=renderer, fps=30)
-  movie.render_clip(0.0, 5.0, lambda t: gen_frame(world, t))
+  fps = 30
+  # With --precompute, simulates every frame ahead of time into
+  # out/nbodies1_trajectory, or reuses the trajectory there if it was
+  # recorded with the same settings, and renders from it. Delete the
+  # directory after changing the simulation code.
+  trajectory = None
+  if '--precompute' in sys.argv:
+    path = 'out/nbodies1_trajectory'
+    settings = dict(world.settings(), fps=fps, duration=5.0)
+    if Trajectory.exists(path, settings):
+      trajectory = Trajectory(path)
+    else:
+      times = np.arange(int(math.ceil(5.0 * fps))) / fps
+      trajectory = Trajectory.record(path, world, times, settings)
+
+  movie = pyrene.Movie(renderer=renderer, fps=fps)
+  movie.render_clip(0.0, 5.0, lambda t: gen_frame(world, t, trajectory))
   movie.write('out/nbodies1.mp4')
+  if isinstance(forces, ParallelForces):
+    forces.close()
 
 
 if __name__ == '__main__':
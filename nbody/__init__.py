@@ -0,0 +1,5 @@
+from .barnes_hut import BarnesHutForces
+from .forces import DirectForces
+from .integrators import BlockTimesteps, Leapfrog, Yoshida4
+from .parallel import ParallelForces
+from .trajectory import Trajectory
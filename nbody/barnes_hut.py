@@ -0,0 +1,224 @@
+import numpy as np
+
+
+# Bits per coordinate in the Morton codes, and so the deepest tree level.
+_MAX_DEPTH = 21
+
+
+def _expand(starts, counts):
+  # Concatenation of the ranges starts[i]:starts[i] + counts[i].
+  total = counts.sum()
+  offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+  return offsets + np.arange(total)
+
+
+def _morton_codes(cells):
+  # Interleaves the bits of the three columns of cells, integers below
+  # 2**_MAX_DEPTH.
+  codes = np.zeros(len(cells), dtype=np.uint64)
+  cells = cells.astype(np.uint64)
+  for bit in range(_MAX_DEPTH):
+    for axis in range(3):
+      codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << (
+          np.uint64(3 * bit + axis))
+  return codes
+
+
+class Octree(object):
+  # An octree over points in Morton order, stored as flat arrays of nodes.
+  # Node i holds the sorted particles start[i]:end[i] and, unless it is a
+  # leaf, the child nodes first_child[i]:first_child[i] + child_count[i].
+  # Children of a node are contiguous, as are all nodes of a level.
+
+  def __init__(self, points, masses, leaf_size=8):
+    lo = points.min(axis=0)
+    size = max(float((points.max(axis=0) - lo).max()), 1e-300) * (1 + 1e-9)
+    cells = np.floor((points - lo) / size * 2 ** _MAX_DEPTH).astype(np.int64)
+    np.clip(cells, 0, 2 ** _MAX_DEPTH - 1, out=cells)
+    codes = _morton_codes(cells)
+    self.order = np.argsort(codes, kind='stable')
+    codes = codes[self.order]
+    self.points = points[self.order]
+    self.masses = masses[self.order]
+    n = len(points)
+
+    starts = [np.array([0])]
+    ends = [np.array([n])]
+    levels = [np.array([0])]
+    leaves = [np.array([n <= leaf_size])]
+    first_children = []
+    child_counts = []
+    # Particles in nodes that are split further.
+    active = np.full(n, n > leaf_size)
+    level = 0
+    while active.any():
+      level += 1
+      prefixes = codes >> np.uint64(3 * (_MAX_DEPTH - level))
+      segment_starts = np.flatnonzero(
+          np.concatenate([[True], prefixes[1:] != prefixes[:-1]]))
+      segment_ends = np.append(segment_starts[1:], n)
+      keep = active[segment_starts]
+      s, e = segment_starts[keep], segment_ends[keep]
+      leaf = (e - s <= leaf_size) | (level == _MAX_DEPTH)
+      # Link the new nodes to their parents, the split nodes of the previous
+      # level, which contain them in the same order.
+      parent_starts = starts[-1][~leaves[-1]]
+      parents = np.searchsorted(parent_starts, s, side='right') - 1
+      first_child = np.full(len(starts[-1]), -1)
+      child_count = np.zeros(len(starts[-1]), dtype=np.int64)
+      offset = sum(len(x) for x in starts)
+      split = np.flatnonzero(~leaves[-1])
+      counts = np.bincount(parents, minlength=len(split))
+      first_child[split] = offset + np.cumsum(counts) - counts
+      child_count[split] = counts
+      first_children.append(first_child)
+      child_counts.append(child_count)
+      starts.append(s)
+      ends.append(e)
+      levels.append(np.full(len(s), level))
+      leaves.append(leaf)
+      # Particles of new leaves are done.
+      change = np.zeros(n + 1, dtype=np.int64)
+      np.add.at(change, s[leaf], 1)
+      np.add.at(change, e[leaf], -1)
+      active &= np.cumsum(change[:-1]) == 0
+    first_children.append(np.full(len(starts[-1]), -1))
+    child_counts.append(np.zeros(len(starts[-1]), dtype=np.int64))
+
+    self.start = np.concatenate(starts)
+    self.end = np.concatenate(ends)
+    self.leaf = np.concatenate(leaves)
+    self.first_child = np.concatenate(first_children)
+    self.child_count = np.concatenate(child_counts)
+    self.size = size / 2.0 ** np.concatenate(levels)
+    # Mass and center of mass of every node.
+    cumulative = np.concatenate([[0], np.cumsum(self.masses)])
+    self.mass = cumulative[self.end] - cumulative[self.start]
+    weighted = np.concatenate(
+        [np.zeros((1, 3)), np.cumsum(self.points * self.masses[:, np.newaxis],
+                                     axis=0)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+      self.com = ((weighted[self.end] - weighted[self.start]) /
+                  self.mass[:, np.newaxis])
+    # Massless nodes have no effect wherever their center is.
+    self.com[self.mass == 0] = self.points[self.start[self.mass == 0]]
+
+
+class BarnesHutForces(object):
+  # Approximate gravity in O(N log N): an octree groups the particles, and a
+  # node of size s acts as a point mass at its center of mass on particles
+  # further than s / theta from it. Nearer leaves are summed directly. The
+  # leaves of the tree are walked down the tree together, chunk_size leaves
+  # at a time, which shares the walk among nearby particles and bounds the
+  # memory of the work lists. theta = 0 gives the direct sum.
+
+  def __init__(self, G=1.0, theta=0.5, leaf_size=8, softening=0.0,
+               chunk_size=256):
+    self.G = G
+    self.theta = theta
+    self.leaf_size = leaf_size
+    self.softening = softening
+    self.chunk_size = chunk_size
+
+  def accelerations(self, points, masses, out=None, part=None, active=None):
+    # With part = (k, parts), only the rows of out of the k-th of parts
+    # shares of the leaves, by number of particles, are set, and with a
+    # boolean mask active only the rows of active particles. Only leaves
+    # with active particles are walked.
+    tree = Octree(points, masses, self.leaf_size)
+    if out is None:
+      out = np.empty_like(points)
+    if active is not None:
+      active = active[tree.order]
+    rows, a = self._walk(tree, False, part, active)
+    if active is None:
+      out[tree.order[rows]] = a
+    else:
+      active = active[rows]
+      out[tree.order[rows][active]] = a[active]
+    return out
+
+  def potential_energy(self, points, masses, part=None):
+    # With part, returns the share of the energy of the particles of part,
+    # half of that of all pairs they are in.
+    tree = Octree(points, masses, self.leaf_size)
+    rows, potential = self._walk(tree, True, part, None)
+    return 0.5 * tree.masses[rows].dot(potential)
+
+  def _walk(self, tree, potential, part, active):
+    # Returns the slice of sorted particles in the leaves of part, and the
+    # acceleration, or the potential, at each of them. Leaves without active
+    # particles, a mask in sorted order, are skipped and get zeros.
+    # The leaves, in the order of their particles.
+    groups = np.flatnonzero(tree.leaf)
+    groups = groups[np.argsort(tree.start[groups])]
+    if active is not None:
+      groups = groups[np.logical_or.reduceat(active, tree.start[groups])]
+    if part is not None:
+      k, parts = part
+      n = len(tree.points)
+      starts = tree.start[groups]
+      groups = groups[(starts >= n * k // parts) &
+                      (starts < n * (k + 1) // parts)]
+    if not len(groups):
+      return slice(0, 0), np.zeros(0 if potential else (0, 3))
+    rows = slice(tree.start[groups[0]], tree.end[groups[-1]])
+    result = np.zeros(tree.end[groups[-1]] if potential else
+                      (tree.end[groups[-1]], 3))
+    sizes = tree.end[groups] - tree.start[groups]
+    # Every particle of a group is within radius of the group's center.
+    offsets = (tree.points[_expand(tree.start[groups], sizes)] -
+               np.repeat(tree.com[groups], sizes, axis=0))
+    radius = np.sqrt(np.maximum.reduceat(
+        np.einsum('ij,ij->i', offsets, offsets), np.cumsum(sizes) - sizes))
+    for chunk in range(0, len(groups), self.chunk_size):
+      g = np.arange(chunk, min(chunk + self.chunk_size, len(groups)))
+      nodes = np.zeros(len(g), dtype=np.int64)
+      while len(g):
+        group_nodes = groups[g]
+        d = tree.com[nodes] - tree.com[group_nodes]
+        dist = np.sqrt(np.einsum('ij,ij->i', d, d)) - radius[g]
+        inside = ((tree.start[nodes] <= tree.start[group_nodes]) &
+                  (tree.start[group_nodes] < tree.end[nodes]))
+        far = ~inside & (dist > 0) & (tree.size[nodes] < self.theta * dist)
+        self._interact(result, tree, group_nodes[far], nodes[far],
+                       tree.com, tree.mass, potential)
+
+        near_leaf = ~far & tree.leaf[nodes]
+        self._interact(result, tree, group_nodes[near_leaf],
+                       nodes[near_leaf], None, None, potential)
+
+        split = ~far & ~tree.leaf[nodes]
+        counts = tree.child_count[nodes[split]]
+        nodes = _expand(tree.first_child[nodes[split]], counts)
+        g = np.repeat(g[split], counts)
+    return rows, result[rows]
+
+  def _interact(self, result, tree, group_nodes, nodes, com, mass, potential):
+    # Adds the effect of the nodes on the particles of the matching groups,
+    # through their centers of mass com and masses mass if given, or else
+    # through their particles.
+    counts = tree.end[group_nodes] - tree.start[group_nodes]
+    targets = _expand(tree.start[group_nodes], counts)
+    nodes = np.repeat(nodes, counts)
+    if com is not None:
+      sources = tree.com[nodes]
+      masses = tree.mass[nodes]
+    else:
+      counts = tree.end[nodes] - tree.start[nodes]
+      sources = _expand(tree.start[nodes], counts)
+      targets = np.repeat(targets, counts)
+      other = sources != targets
+      targets, sources = targets[other], sources[other]
+      masses = tree.masses[sources]
+      sources = tree.points[sources]
+    d = sources - tree.points[targets]
+    r2 = np.einsum('ij,ij->i', d, d) + self.softening ** 2
+    n = len(result)
+    if potential:
+      result -= self.G * np.bincount(targets, masses / np.sqrt(r2),
+                                     minlength=n)
+      return
+    k = self.G * masses / (r2 * np.sqrt(r2))
+    for axis in range(3):
+      result[:, axis] += np.bincount(targets, k * d[:, axis], minlength=n)
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+class DirectForces(object):
+  # Gravity summed over all pairs of particles, O(N²). Particles are split
+  # into blocks of block_size, and every pair of blocks is visited once: the
+  # accelerations it causes in both blocks come from the same distances,
+  # since forces are symmetric. The (block_size, block_size) temporaries are
+  # allocated once and reused, so memory stays bounded for large N.
+
+  def __init__(self, G=1.0, block_size=512, softening=0.0):
+    self.G = G
+    self.block_size = block_size
+    # Added to every distance in quadrature, which keeps close encounters
+    # finite.
+    self.softening = softening
+    self._buffers = None
+
+  def _get_buffers(self):
+    if self._buffers is None:
+      b = self.block_size
+      self._buffers = [np.empty((b, b)) for _ in range(3)]
+    return self._buffers
+
+  def _pairs(self, points, targets=None):
+    # Yields the slices of every pair of blocks i <= j, with the squared
+    # distances between their particles and a scratch array of the same
+    # shape, both in reused buffers. With an array of targets, yields instead
+    # the indices of every block of the targets with every block of all
+    # particles.
+    r2_buf, tmp_buf, _ = self._get_buffers()
+    n = len(points)
+    b = self.block_size
+    if targets is None:
+      blocks = ((slice(i, min(i + b, n)), j)
+                for i in range(0, n, b) for j in range(i, n, b))
+    else:
+      blocks = ((targets[i:i + b], j)
+                for i in range(0, len(targets), b) for j in range(0, n, b))
+    for bi, j in blocks:
+      bj = slice(j, min(j + b, n))
+      p = points[bi]
+      shape = (len(p), bj.stop - bj.start)
+      r2 = r2_buf[:shape[0], :shape[1]]
+      tmp = tmp_buf[:shape[0], :shape[1]]
+      r2.fill(self.softening ** 2)
+      for c in range(3):
+        np.subtract(points[np.newaxis, bj, c], p[:, c, np.newaxis], out=tmp)
+        tmp *= tmp
+        r2 += tmp
+      # No particle acts on itself.
+      if targets is None:
+        if bi.start == j:
+          np.fill_diagonal(r2, np.inf)
+      else:
+        rows = np.flatnonzero((bi >= j) & (bi < bj.stop))
+        r2[rows, bi[rows] - j] = np.inf
+      yield bi, bj, r2, tmp
+
+  @staticmethod
+  def _targets(n, part, active):
+    # The indices of the particles of part (k, parts), the k-th of parts
+    # equal shares, that are active, or None for all particles.
+    if part is None and active is None:
+      return None
+    if part is None:
+      return np.flatnonzero(active)
+    k, parts = part
+    targets = np.arange(n * k // parts, n * (k + 1) // parts)
+    if active is not None:
+      targets = targets[active[targets]]
+    return targets
+
+  def accelerations(self, points, masses, out=None, part=None, active=None):
+    # With part = (k, parts), only the rows of out of the k-th of parts equal
+    # shares of the particles are set, and with a boolean mask active only
+    # the rows of active particles. Pairs of blocks are then visited from
+    # the side of the targets only, so parts are independent.
+    if out is None:
+      out = np.empty_like(points)
+    targets = self._targets(len(points), part, active)
+    if targets is None:
+      out[:] = 0
+    else:
+      out[targets] = 0
+    k_buf = self._get_buffers()[2]
+    for bi, bj, r2, tmp in self._pairs(points, targets):
+      # k = 1 / r³
+      k = k_buf[:r2.shape[0], :r2.shape[1]]
+      np.sqrt(r2, out=k)
+      k *= r2
+      np.reciprocal(k, out=k)
+      # a_i = G Σ_j m_j (p_j - p_i) / r³ = G (Σ_j w_ij p_j - p_i Σ_j w_ij)
+      # with w_ij = m_j / r³, as matrix products.
+      np.multiply(k, masses[np.newaxis, bj], out=tmp)
+      out[bi] += self.G * (tmp.dot(points[bj]) -
+                           points[bi] * tmp.sum(axis=1)[:, np.newaxis])
+      if targets is None and bi != bj:
+        np.multiply(k, masses[bi, np.newaxis], out=tmp)
+        out[bj] += self.G * (tmp.T.dot(points[bi]) -
+                             points[bj] * tmp.sum(axis=0)[:, np.newaxis])
+    return out
+
+  def potential_energy(self, points, masses, part=None):
+    # With part, returns the share of the energy of the particles of part,
+    # half of that of all pairs they are in.
+    targets = self._targets(len(points), part, None)
+    energy = 0.0
+    for bi, bj, r2, tmp in self._pairs(points, targets):
+      np.sqrt(r2, out=tmp)
+      np.reciprocal(tmp, out=tmp)
+      pairs = masses[bi].dot(tmp).dot(masses[bj])
+      # Pairs within a block, and all pairs of parts, are visited in both
+      # orders.
+      if targets is not None or bi == bj:
+        pairs /= 2
+      energy -= self.G * pairs
+    return energy
@@ -0,0 +1,113 @@
+import math
+import numpy as np
+
+
+# Integrators advance a system, an object with arrays points, velocities and
+# masses, a force solver forces, see DirectForces, the time t and
+# accelerations, the accelerations at points or None if unknown, to a time
+# t1. They land on t1 exactly: the steps up to it are shortened to fit a
+# whole number of them into the interval. The accelerations at the end of
+# one call are kept for the next, so a step of a leapfrog costs one force
+# evaluation.
+
+
+def _steps(t, t1, dt):
+  # The number and length of the steps of at most dt from t to t1.
+  if t1 <= t:
+    return 0, 0.0
+  n = max(int(math.ceil((t1 - t) / dt * (1 - 1e-12))), 1)
+  return n, (t1 - t) / n
+
+
+def _accelerations(system):
+  if system.accelerations is None:
+    system.accelerations = system.forces.accelerations(system.points,
+                                                       system.masses)
+  return system.accelerations
+
+
+def _kick_drift_kick(system, h):
+  # A leapfrog step of length h.
+  a = _accelerations(system)
+  system.velocities += h / 2 * a
+  system.points += h * system.velocities
+  system.forces.accelerations(system.points, system.masses, out=a)
+  system.velocities += h / 2 * a
+
+
+class Leapfrog(object):
+  # Second order kick-drift-kick leapfrog with steps of at most dt.
+
+  def __init__(self, dt=0.001):
+    self.dt = dt
+
+  def advance(self, system, t1):
+    n, h = _steps(system.t, t1, self.dt)
+    for _ in range(n):
+      _kick_drift_kick(system, h)
+    system.t = max(system.t, t1)
+
+
+class Yoshida4(object):
+  # Fourth order integrator of Yoshida (1990): each step of at most dt is
+  # three leapfrog steps, the middle one backwards in time. Costs three
+  # force evaluations per step, but allows far longer steps than the
+  # leapfrog for the same accuracy.
+
+  _W1 = 1 / (2 - 2 ** (1 / 3))
+  _W0 = -2 ** (1 / 3) * _W1
+
+  def __init__(self, dt=0.01):
+    self.dt = dt
+
+  def advance(self, system, t1):
+    n, h = _steps(system.t, t1, self.dt)
+    for _ in range(n):
+      for w in (self._W1, self._W0, self._W1):
+        _kick_drift_kick(system, w * h)
+    system.t = max(system.t, t1)
+
+
+class BlockTimesteps(object):
+  # Leapfrog with individual time steps: particle i takes steps of
+  # dt / 2**k, the longest allowed by its acceleration a,
+  # sqrt(2 eta softening / |a|), down to dt / 2**max_level. Steps of all
+  # particles are nested, so each substep only computes the accelerations
+  # of the particles whose step ends, and a close encounter only shortens
+  # the steps of the particles in it. softening should be that of the force
+  # solver. Levels are chosen at the start of every step of dt.
+
+  def __init__(self, dt=0.01, eta=0.02, softening=0.05, max_level=10):
+    self.dt = dt
+    self.eta = eta
+    self.softening = softening
+    self.max_level = max_level
+
+  def levels(self, accelerations, dt):
+    # The level k of every particle for steps of at most dt.
+    a = np.linalg.norm(accelerations, axis=1)
+    with np.errstate(divide='ignore'):
+      steps = np.sqrt(2 * self.eta * self.softening / a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      levels = np.ceil(np.log2(dt / steps))
+    return np.clip(np.nan_to_num(levels), 0, self.max_level).astype(int)
+
+  def advance(self, system, t1):
+    n, h = _steps(system.t, t1, self.dt)
+    for _ in range(n):
+      a = _accelerations(system)
+      levels = self.levels(a, h)
+      depth = levels.max()
+      # Particle i takes a step every 2**(depth - levels[i]) substeps.
+      period = 2 ** (depth - levels)
+      half_kick = (h / 2.0 ** levels / 2)[:, np.newaxis]
+      substep = h / 2 ** depth
+      for s in range(2 ** depth):
+        starting = s % period == 0
+        system.velocities[starting] += half_kick[starting] * a[starting]
+        system.points += substep * system.velocities
+        ending = (s + 1) % period == 0
+        system.forces.accelerations(system.points, system.masses, out=a,
+                                    active=None if ending.all() else ending)
+        system.velocities[ending] += half_kick[ending] * a[ending]
+    system.t = max(system.t, t1)
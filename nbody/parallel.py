@@ -0,0 +1,120 @@
+import multiprocessing
+import numpy as np
+import os
+from multiprocessing import shared_memory
+
+
+# State of a worker process, set once by _init_worker.
+_worker = {}
+
+
+def _init_worker(forces, arrays):
+  # Maps the shared arrays, given as (name, shape, dtype) by key, into the
+  # worker.
+  _worker['forces'] = forces
+  _worker['memory'] = []
+  for key, (name, shape, dtype) in arrays.items():
+    memory = shared_memory.SharedMemory(name=name)
+    _worker['memory'].append(memory)
+    _worker[key] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _accelerations(part, active):
+  _worker['forces'].accelerations(
+      _worker['points'], _worker['masses'], out=_worker['out'], part=part,
+      active=_worker['active'] if active else None)
+
+
+def _potential_energy(part):
+  return _worker['forces'].potential_energy(_worker['points'],
+                                            _worker['masses'], part=part)
+
+
+class ParallelForces(object):
+  # Evaluates another solver, e.g. DirectForces or BarnesHutForces, in a pool
+  # of processes. Each process computes the accelerations of its share of
+  # the particles. Positions, masses, accelerations and the mask of active
+  # particles live in shared memory which the processes map once, so a step
+  # only copies the positions and masses in and the accelerations out, and
+  # sends each process its share as a pair of integers. The pool and shared
+  # memory are kept for the next steps as long as the number of particles
+  # stays the same; close releases them.
+
+  def __init__(self, forces, processes=None):
+    self.forces = forces
+    self.processes = processes or os.cpu_count()
+    self._pool = None
+    self._memory = []
+    self._arrays = None
+    self._n = None
+
+  def _start(self, n):
+    if n == self._n:
+      return
+    self.close()
+    arrays = {}
+    shared = {}
+    for key, shape, dtype in (('points', (n, 3), np.float64),
+                              ('masses', (n,), np.float64),
+                              ('out', (n, 3), np.float64),
+                              ('active', (n,), np.bool_)):
+      size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+      memory = shared_memory.SharedMemory(create=True, size=size)
+      self._memory.append(memory)
+      arrays[key] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+      shared[key] = (memory.name, shape, dtype)
+    self._arrays = arrays
+    # Workers come from a fork server rather than a fork of this process,
+    # which may have other threads, e.g. Movie's, holding locks.
+    context = multiprocessing.get_context('forkserver')
+    self._pool = context.Pool(
+        self.processes, initializer=_init_worker,
+        initargs=(self.forces, shared))
+    self._n = n
+
+  def _share(self, points, masses):
+    self._start(len(points))
+    self._arrays['points'][:] = points
+    self._arrays['masses'][:] = masses
+
+  def _parts(self):
+    return [(k, self.processes) for k in range(self.processes)]
+
+  def accelerations(self, points, masses, out=None, active=None):
+    # With a boolean mask active, only the rows of out of active particles
+    # are set.
+    self._share(points, masses)
+    if active is not None:
+      self._arrays['active'][:] = active
+    self._pool.starmap(_accelerations, [(part, active is not None)
+                                        for part in self._parts()])
+    result = self._arrays['out']
+    if out is None:
+      out = np.empty_like(points)
+    if active is None:
+      out[:] = result
+    else:
+      out[active] = result[active]
+    return out
+
+  def potential_energy(self, points, masses):
+    self._share(points, masses)
+    return sum(self._pool.map(_potential_energy, self._parts()))
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+    self._arrays = None
+    for memory in self._memory:
+      memory.close()
+      memory.unlink()
+    self._memory = []
+    self._n = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
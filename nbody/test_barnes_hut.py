@@ -0,0 +1,109 @@
+import numpy as np
+import unittest
+
+from nbody.barnes_hut import BarnesHutForces, Octree
+from nbody.forces import DirectForces
+
+
+def relative_errors(a, expected):
+  return (np.linalg.norm(a - expected, axis=1) /
+          np.linalg.norm(expected, axis=1))
+
+
+class TestOctree(unittest.TestCase):
+
+  def test_nodes(self):
+    rng = np.random.RandomState(0)
+    points = rng.normal(size=(500, 3))
+    masses = rng.random_sample(500)
+    tree = Octree(points, masses, leaf_size=4)
+    np.testing.assert_array_equal(tree.points, points[tree.order])
+    self.assertAlmostEqual(tree.mass[0], masses.sum())
+    # Every particle is in exactly one leaf of at most leaf_size particles.
+    leaves = np.flatnonzero(tree.leaf)
+    sizes = tree.end[leaves] - tree.start[leaves]
+    self.assertEqual(sizes.sum(), 500)
+    self.assertLessEqual(sizes.max(), 4)
+    # Children split their parent's particles.
+    for i in np.flatnonzero(~tree.leaf):
+      children = np.arange(tree.child_count[i]) + tree.first_child[i]
+      self.assertEqual(tree.start[children[0]], tree.start[i])
+      self.assertEqual(tree.end[children[-1]], tree.end[i])
+      np.testing.assert_array_equal(tree.start[children[1:]],
+                                    tree.end[children[:-1]])
+
+
+class TestBarnesHutForces(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.points = rng.normal(size=(2000, 3))
+    self.masses = rng.random_sample(2000)
+    self.direct = DirectForces(G=2.0, softening=0.01)
+
+  def test_exact(self):
+    # Without approximation, every pair of particles is summed.
+    forces = BarnesHutForces(G=2.0, theta=0, softening=0.01)
+    np.testing.assert_allclose(
+        forces.accelerations(self.points, self.masses),
+        self.direct.accelerations(self.points, self.masses),
+        rtol=1e-9, atol=1e-9)
+
+  def test_accuracy(self):
+    expected = self.direct.accelerations(self.points, self.masses)
+    errors = []
+    for theta in (0.3, 0.5, 0.8):
+      forces = BarnesHutForces(G=2.0, theta=theta, softening=0.01)
+      errors.append(np.median(relative_errors(
+          forces.accelerations(self.points, self.masses), expected)))
+    self.assertLess(errors[1], 5e-3)
+    self.assertEqual(errors, sorted(errors))
+
+  def test_potential_energy(self):
+    forces = BarnesHutForces(G=2.0, theta=0.5, softening=0.01)
+    expected = self.direct.potential_energy(self.points, self.masses)
+    self.assertAlmostEqual(
+        forces.potential_energy(self.points, self.masses) / expected, 1,
+        places=3)
+
+  def test_out(self):
+    forces = BarnesHutForces(theta=0.5)
+    out = np.empty_like(self.points)
+    self.assertIs(forces.accelerations(self.points, self.masses, out=out), out)
+    np.testing.assert_array_equal(
+        out, forces.accelerations(self.points, self.masses))
+
+  def test_parts(self):
+    forces = BarnesHutForces(G=2.0, theta=0.5, softening=0.01)
+    expected = forces.accelerations(self.points, self.masses)
+    out = np.full_like(self.points, np.nan)
+    energy = 0.0
+    for k in range(3):
+      forces.accelerations(self.points, self.masses, out=out, part=(k, 3))
+      energy += forces.potential_energy(self.points, self.masses,
+                                        part=(k, 3))
+    np.testing.assert_allclose(out, expected, rtol=1e-12, atol=1e-12)
+    self.assertAlmostEqual(
+        energy / forces.potential_energy(self.points, self.masses), 1)
+
+  def test_single_leaf(self):
+    points = self.points[:5]
+    masses = self.masses[:5]
+    np.testing.assert_allclose(
+        BarnesHutForces(G=2.0, softening=0.01).accelerations(points, masses),
+        self.direct.accelerations(points, masses), rtol=1e-10)
+
+  def test_coincident_points(self):
+    # More particles than leaf_size at one point still end up in a leaf.
+    points = np.concatenate([np.zeros((20, 3)), self.points[:20]])
+    masses = np.ones(40)
+    forces = BarnesHutForces(theta=0.5, softening=0.1)
+    a = forces.accelerations(points, masses)
+    self.assertTrue(np.isfinite(a).all())
+    np.testing.assert_allclose(
+        a, DirectForces(softening=0.1).accelerations(points, masses),
+        rtol=1e-2, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
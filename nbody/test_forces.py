@@ -0,0 +1,69 @@
+import numpy as np
+import unittest
+
+from nbody.forces import DirectForces
+
+
+def reference_accelerations(points, masses, G=1.0, softening=0.0):
+  a = np.zeros_like(points)
+  for i in range(len(points)):
+    for j in range(len(points)):
+      if i != j:
+        d = points[j] - points[i]
+        r2 = d.dot(d) + softening ** 2
+        a[i] += G * masses[j] * d / r2 ** 1.5
+  return a
+
+
+class TestDirectForces(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.points = rng.normal(size=(50, 3))
+    self.masses = rng.random_sample(50)
+
+  def test_accelerations(self):
+    expected = reference_accelerations(self.points, self.masses, G=2.0)
+    for block_size in (7, 16, 64):
+      forces = DirectForces(G=2.0, block_size=block_size)
+      np.testing.assert_allclose(
+          forces.accelerations(self.points, self.masses), expected,
+          rtol=1e-10, atol=1e-12)
+
+  def test_softening(self):
+    forces = DirectForces(block_size=16, softening=0.1)
+    np.testing.assert_allclose(
+        forces.accelerations(self.points, self.masses),
+        reference_accelerations(self.points, self.masses, softening=0.1),
+        rtol=1e-10, atol=1e-12)
+
+  def test_momentum(self):
+    a = DirectForces(block_size=16).accelerations(self.points, self.masses)
+    np.testing.assert_allclose(self.masses.dot(a), 0, atol=1e-10)
+
+  def test_potential_energy(self):
+    expected = 0.0
+    for i in range(len(self.points)):
+      for j in range(i + 1, len(self.points)):
+        expected -= (self.masses[i] * self.masses[j] /
+                     np.linalg.norm(self.points[i] - self.points[j]))
+    self.assertAlmostEqual(
+        DirectForces(block_size=16).potential_energy(self.points, self.masses),
+        expected)
+
+  def test_parts(self):
+    forces = DirectForces(G=2.0, block_size=16)
+    expected = forces.accelerations(self.points, self.masses)
+    out = np.full_like(self.points, np.nan)
+    energy = 0.0
+    for k in range(3):
+      forces.accelerations(self.points, self.masses, out=out, part=(k, 3))
+      energy += forces.potential_energy(self.points, self.masses,
+                                        part=(k, 3))
+    np.testing.assert_allclose(out, expected, rtol=1e-10, atol=1e-12)
+    self.assertAlmostEqual(
+        energy, forces.potential_energy(self.points, self.masses))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import numpy as np
+import unittest
+
+from nbody.forces import DirectForces
+from nbody.integrators import BlockTimesteps, Leapfrog, Yoshida4
+
+
+class CountingForces(DirectForces):
+  # Counts the accelerations computed, one per active particle.
+
+  def __init__(self, *args, **kwargs):
+    DirectForces.__init__(self, *args, **kwargs)
+    self.count = 0
+
+  def accelerations(self, points, masses, out=None, part=None, active=None):
+    self.count += len(points) if active is None else active.sum()
+    return DirectForces.accelerations(self, points, masses, out=out,
+                                      part=part, active=active)
+
+
+class System(object):
+
+  def __init__(self, points, velocities, masses, forces):
+    self.points = np.array(points, dtype=float)
+    self.velocities = np.array(velocities, dtype=float)
+    self.masses = np.array(masses, dtype=float)
+    self.forces = forces
+    self.t = 0.0
+    self.accelerations = None
+
+  def energy(self):
+    return (np.sum(self.masses * np.sum(self.velocities ** 2, axis=1)) / 2 +
+            self.forces.potential_energy(self.points, self.masses))
+
+
+def binary(eccentricity=0.0, forces=None):
+  # Two unit masses at apocenter of an orbit with semi-major axis 1, whose
+  # period is 2 pi / sqrt(2).
+  r = 1 + eccentricity
+  v = np.sqrt(2 * (1 - eccentricity) / r) / 2
+  return System([[-r / 2, 0, 0], [r / 2, 0, 0]], [[0, -v, 0], [0, v, 0]],
+                [1, 1], forces or CountingForces())
+
+
+class TestIntegrators(unittest.TestCase):
+
+  def test_frame_times(self):
+    # Frames land exactly on their times, without overshooting.
+    for integrator in (Leapfrog(dt=0.003), Yoshida4(dt=0.03),
+                       BlockTimesteps(dt=0.03, softening=0.01)):
+      system = binary()
+      for frame in range(1, 31):
+        integrator.advance(system, frame / 30)
+        self.assertEqual(system.t, frame / 30)
+      # Going back in time does nothing.
+      integrator.advance(system, 0.5)
+      self.assertEqual(system.t, 1.0)
+
+  def test_circular_orbit(self):
+    period = 2 * np.pi / np.sqrt(2)
+    errors = []
+    for integrator in (Leapfrog(dt=0.01), Yoshida4(dt=0.03)):
+      system = binary()
+      start = system.points.copy()
+      integrator.advance(system, period)
+      errors.append(np.abs(system.points - start).max())
+    self.assertLess(errors[0], 1e-3)
+    self.assertLess(errors[1], 1e-5)
+
+  def test_order(self):
+    # Halving the step divides the error by 2**order.
+    for integrator, order in ((Leapfrog(), 2), (Yoshida4(), 4)):
+      errors = []
+      for dt in (0.1, 0.05):
+        integrator.dt = dt
+        system = binary()
+        integrator.advance(system, 2 * np.pi / np.sqrt(2))
+        errors.append(np.abs(system.points - binary().points).max())
+      self.assertAlmostEqual(np.log2(errors[0] / errors[1]), order, delta=0.3)
+
+  def test_block_timesteps(self):
+    # An eccentric binary, which needs short steps near pericenter only, in
+    # a cluster of particles that do not. Individual steps conserve energy
+    # better than a leapfrog with the same number of accelerations.
+    rng = np.random.RandomState(0)
+    cluster = rng.normal(scale=20, size=(30, 3))
+    pair = binary(eccentricity=0.95)
+    points = np.concatenate([pair.points, cluster])
+    velocities = np.concatenate([pair.velocities, np.zeros((30, 3))])
+    masses = np.concatenate([pair.masses, np.full(30, 1e-3)])
+    errors = []
+    counts = []
+    for integrator in (BlockTimesteps(dt=0.05, eta=0.002, softening=0.01),
+                       Leapfrog(dt=0.05 / 8)):
+      system = System(points, velocities, masses,
+                      CountingForces(softening=0.01))
+      energy = system.energy()
+      integrator.advance(system, 5.0)
+      errors.append(abs(system.energy() / energy - 1))
+      counts.append(system.forces.count)
+    self.assertLess(counts[0], counts[1])
+    self.assertLess(errors[0], errors[1])
+
+  def test_levels(self):
+    integrator = BlockTimesteps(dt=1.0, eta=0.5, softening=1.0, max_level=4)
+    a = np.array([[0, 0, 0], [0.5, 0, 0], [1, 0, 0], [16, 0, 0], [1e9, 0, 0]])
+    np.testing.assert_array_equal(integrator.levels(a, 1.0), [0, 0, 0, 2, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import numpy as np
+import unittest
+
+from nbody.barnes_hut import BarnesHutForces
+from nbody.forces import DirectForces
+from nbody.parallel import ParallelForces
+
+
+class TestParallelForces(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    self.points = rng.normal(size=(300, 3))
+    self.masses = rng.random_sample(300)
+
+  def check(self, forces):
+    with ParallelForces(forces, processes=3) as parallel:
+      out = np.empty_like(self.points)
+      self.assertIs(parallel.accelerations(self.points, self.masses, out=out),
+                    out)
+      np.testing.assert_allclose(
+          out, forces.accelerations(self.points, self.masses),
+          rtol=1e-10, atol=1e-12)
+      self.assertAlmostEqual(
+          parallel.potential_energy(self.points, self.masses),
+          forces.potential_energy(self.points, self.masses))
+      active = np.arange(len(self.points)) % 7 == 0
+      out = np.zeros_like(self.points)
+      parallel.accelerations(self.points, self.masses, out=out, active=active)
+      np.testing.assert_allclose(
+          out[active], forces.accelerations(self.points, self.masses)[active],
+          rtol=1e-10, atol=1e-12)
+      self.assertFalse(out[~active].any())
+      # Later steps reuse the pool and shared memory with new positions.
+      points = self.points * 2
+      np.testing.assert_allclose(
+          parallel.accelerations(points, self.masses),
+          forces.accelerations(points, self.masses), rtol=1e-10, atol=1e-12)
+
+  def test_direct(self):
+    self.check(DirectForces(block_size=64))
+
+  def test_barnes_hut(self):
+    self.check(BarnesHutForces(theta=0.5))
+
+  def test_resize(self):
+    forces = DirectForces(block_size=64)
+    with ParallelForces(forces, processes=2) as parallel:
+      parallel.accelerations(self.points, self.masses)
+      np.testing.assert_allclose(
+          parallel.accelerations(self.points[:10], self.masses[:10]),
+          forces.accelerations(self.points[:10], self.masses[:10]),
+          rtol=1e-10, atol=1e-12)
+
+  def test_close(self):
+    parallel = ParallelForces(DirectForces(), processes=2)
+    parallel.accelerations(self.points, self.masses)
+    parallel.close()
+    parallel.close()
+    self.assertEqual(parallel.accelerations(self.points, self.masses).shape,
+                     self.points.shape)
+    parallel.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from nbody.forces import DirectForces
+from nbody.integrators import Leapfrog
+from nbody.trajectory import Trajectory
+
+
+class System(object):
+
+  def __init__(self):
+    rng = np.random.RandomState(0)
+    self.points = rng.normal(size=(20, 3))
+    self.velocities = rng.normal(size=(20, 3))
+    self.masses = rng.random_sample(20)
+    self.forces = DirectForces(softening=0.1)
+    self.integrator = Leapfrog(dt=0.01)
+    self.t = 0.0
+    self.accelerations = None
+
+  def simulate(self, t1):
+    self.integrator.advance(self, t1)
+
+
+class TestTrajectory(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmpdir, 'trajectory')
+    self.times = np.arange(10) / 30
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_record(self):
+    self.assertFalse(Trajectory.exists(self.path))
+    recorded = Trajectory.record(self.path, System(), self.times)
+    self.assertTrue(Trajectory.exists(self.path))
+    trajectory = Trajectory(self.path)
+    self.assertEqual(len(trajectory), 10)
+    self.assertEqual(recorded.points.shape, (10, 20, 3))
+    system = System()
+    for t in self.times:
+      system.simulate(t)
+      points, velocities = trajectory.frame(t)
+      np.testing.assert_array_equal(points, system.points)
+      np.testing.assert_array_equal(velocities, system.velocities)
+
+  def test_interrupted_record(self):
+    Trajectory.record(self.path, System(), self.times)
+
+    class Interrupted(Exception):
+      pass
+
+    system = System()
+    simulate = system.simulate
+
+    def interrupt(t):
+      if t > 0.1:
+        raise Interrupted()
+      simulate(t)
+
+    system.simulate = interrupt
+    with self.assertRaises(Interrupted):
+      Trajectory.record(self.path, system, self.times)
+    self.assertFalse(Trajectory.exists(self.path))
+    with self.assertRaises(FileNotFoundError):
+      Trajectory(self.path)
+
+  def test_settings(self):
+    settings = {'shape': (20, 3), 'dt': 0.01}
+    Trajectory.record(self.path, System(), self.times, settings)
+    self.assertTrue(Trajectory.exists(self.path))
+    self.assertTrue(Trajectory.exists(self.path, settings))
+    self.assertFalse(Trajectory.exists(self.path, {'shape': (30, 3),
+                                                   'dt': 0.01}))
+    self.assertEqual(Trajectory(self.path).settings,
+                     {'shape': [20, 3], 'dt': 0.01})
+
+  def test_random_access(self):
+    trajectory = Trajectory.record(self.path, System(), self.times)
+    # Times computed differently find the same frames.
+    self.assertEqual(trajectory.index(0.1 + 0.2), 9)
+    self.assertEqual(trajectory.index(0.0), 0)
+    points, _ = trajectory.frame(4 / 30)
+    np.testing.assert_array_equal(points, trajectory.points[4])
+    with self.assertRaises(KeyError):
+      trajectory.index(0.05)
+    with self.assertRaises(KeyError):
+      trajectory.index(1.0)
+
+  def test_frames_are_copies(self):
+    trajectory = Trajectory.record(self.path, System(), self.times)
+    points, _ = trajectory.frame(0.0)
+    expected = points.copy()
+    points += 1
+    np.testing.assert_array_equal(Trajectory(self.path).points[0], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
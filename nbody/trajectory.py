@@ -0,0 +1,80 @@
+import json
+import numpy as np
+import os
+
+
+class Trajectory(object):
+  # Positions and velocities of all particles at a sequence of times, stored
+  # in a directory as points.npy and velocities.npy, of shape (frames, n, 3),
+  # and times.npy, with the settings it was simulated with in settings.json.
+  # The arrays are memory-mapped, so opening a trajectory is cheap and a frame
+  # is only read from disk when it is used.
+
+  def __init__(self, path):
+    self.path = path
+    self.times = np.load(os.path.join(path, 'times.npy'))
+    self.settings = self._load_settings(path)
+    self.points = np.load(os.path.join(path, 'points.npy'), mmap_mode='r')
+    self.velocities = np.load(os.path.join(path, 'velocities.npy'),
+                              mmap_mode='r')
+
+  @staticmethod
+  def _load_settings(path):
+    settings_path = os.path.join(path, 'settings.json')
+    if not os.path.exists(settings_path):
+      return None
+    with open(settings_path) as f:
+      return json.load(f)
+
+  @classmethod
+  def exists(cls, path, settings=None):
+    # times.npy is written last, so an interrupted recording does not count.
+    # With settings, a recording with other settings does not count either.
+    if not os.path.exists(os.path.join(path, 'times.npy')):
+      return False
+    return (settings is None or
+            cls._load_settings(path) == json.loads(json.dumps(settings)))
+
+  @classmethod
+  def record(cls, path, system, times, settings=None):
+    # Simulates system, with simulate(t), points and velocities, e.g.
+    # nbodies.World, to each of the increasing times and writes the frames
+    # one by one, so memory does not grow with their number. settings, a
+    # dict that can be written as JSON, describes the simulation for exists.
+    os.makedirs(path, exist_ok=True)
+    # A previous recording stops counting before its frames are overwritten.
+    times_path = os.path.join(path, 'times.npy')
+    if os.path.exists(times_path):
+      os.remove(times_path)
+    with open(os.path.join(path, 'settings.json'), 'w') as f:
+      json.dump(settings, f, indent=2, sort_keys=True)
+    times = np.asarray(times, dtype=np.float64)
+    shape = (len(times),) + system.points.shape
+    points = np.lib.format.open_memmap(
+        os.path.join(path, 'points.npy'), mode='w+', shape=shape)
+    velocities = np.lib.format.open_memmap(
+        os.path.join(path, 'velocities.npy'), mode='w+', shape=shape)
+    for i, t in enumerate(times):
+      system.simulate(t)
+      points[i] = system.points
+      velocities[i] = system.velocities
+    points.flush()
+    velocities.flush()
+    del points, velocities
+    np.save(times_path, times)
+    return cls(path)
+
+  def __len__(self):
+    return len(self.times)
+
+  def index(self, t):
+    # The frame at time t, up to rounding.
+    i = int(np.argmin(np.abs(self.times - t)))
+    if not np.isclose(self.times[i], t, rtol=1e-9, atol=1e-12):
+      raise KeyError('No frame at time %f in %s' % (t, self.path))
+    return i
+
+  def frame(self, t):
+    # The positions and velocities at time t, read from disk.
+    i = self.index(t)
+    return np.array(self.points[i]), np.array(self.velocities[i])
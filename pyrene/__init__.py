@@ -1,14 +1,16 @@
 import json
 import logging
-import math
-import moviepy.editor as mpy
-import os
-import shutil
-import tempfile
 
 from . import lux
 from . import pbrt
-from .scene import Camera, Sphere, AreaLight, Scene
+from . import raster
+from .adaptive import AdaptiveSampling
+from .cache import FrameCache
+from .movie import Movie, Preview
+from .process import RenderError
+from .scheduler import LocalWorker, RemoteWorker, SshTransport
+from .scene import (
+    Camera, Sphere, SphereSet, Mesh, Instance, AreaLight, World, Scene)
 
 
 def create_renderer(renderer=None, config=None, **kwargs):
@@ -24,6 +26,10 @@ def create_renderer(renderer=None, config=None, **kwargs):
   if renderer in config:
     params.update(config[renderer])
   params.update(kwargs)
+  if isinstance(params.get('cache'), dict):
+    params['cache'] = FrameCache(**params['cache'])
+  if isinstance(params.get('adaptive'), dict):
+    params['adaptive'] = AdaptiveSampling(**params['adaptive'])
 
   logging.info('Creating a renderer %s with parameters %s', renderer, params)
 
@@ -31,40 +37,6 @@ def create_renderer(renderer=None, config=None, **kwargs):
     return lux.LuxRenderer(**params)
   elif renderer == 'pbrt':
     return pbrt.PbrtRenderer(**params)
+  elif renderer == 'raster':
+    return raster.RasterRenderer(**params)
   raise Exception('Unknown renderer type: {}'.format(renderer))
-
-
-class Movie(object):
-  def __init__(self, renderer, fps=60):
-    self.renderer = renderer
-    self.fps = fps
-    self.dir = tempfile.TemporaryDirectory()
-    self.frames = []
-    self.scenes = []
-    logging.info('Created a temporary directory %s for frame images.',
-                 self.dir.name)
-
-  def __del__(self):
-    logging.info('Deleting temporary directory %s.', self.dir.name)
-    self.dir.cleanup()
-
-  def render_clip(self, start, end, frame_func):
-    logging.info('Rendering a clip from %f to %f', start, end)
-    for f in range(int(math.ceil((end - start) * self.fps))):
-      frame_path = os.path.join(
-          self.dir.name,
-          'f{:05}.png'.format(len(self.frames)))
-      scene_path = os.path.join(
-          self.dir.name,
-          'f{:05}.{ext}'.format(len(self.scenes),
-                                ext=self.renderer.scene_file_ext))
-      self.scenes.append(scene_path)
-      self.frames.append(frame_path)
-      self.renderer.output_file = frame_path
-      self.renderer.scene_file = scene_path
-      scene = frame_func(start + f / self.fps)
-      self.renderer.render(scene, generate_only=False)
-
-  def write(self, output):
-    clip = mpy.ImageSequenceClip(self.frames, fps=self.fps)
-    clip.write_videofile(output, fps=self.fps, audio=False)
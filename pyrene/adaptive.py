@@ -0,0 +1,73 @@
+import logging
+import numpy as np
+import os
+import time
+
+
+def relative_error(image, previous):
+  scale = np.mean(np.abs(image))
+  if scale == 0:
+    return 0.0
+  return float(np.mean(np.abs(image - previous)) / scale)
+
+
+class AdaptiveSampling(object):
+  # Renders a frame in passes with min_samples, 2 * min_samples, ... samples
+  # per pixel. The difference between successive passes estimates the noise
+  # left in the image, and rendering stops once it drops below target_error,
+  # the next pass would exceed time_budget seconds or max_samples is reached.
+
+  def __init__(self, target_error=0.01, time_budget=None, min_samples=4,
+               max_samples=4096):
+    assert min_samples <= max_samples
+    self.target_error = target_error
+    self.time_budget = time_budget
+    self.min_samples = min_samples
+    self.max_samples = max_samples
+
+  def settings(self):
+    return {
+        'target_error': self.target_error,
+        'time_budget': self.time_budget,
+        'min_samples': self.min_samples,
+        'max_samples': self.max_samples,
+    }
+
+  def render(self, render_pass, read_image, stats=None):
+    # render_pass(samples) renders a pass and returns the path of its output.
+    # Returns the path of the final pass; the other outputs are deleted.
+    start = time.time()
+    samples = self.min_samples
+    previous = None
+    error = None
+    outputs = []
+    rendered = 0
+    while True:
+      pass_start = time.time()
+      outputs.append(render_pass(samples))
+      rendered += samples
+      pass_time = time.time() - pass_start
+      image = read_image(outputs[-1])
+      if previous is not None:
+        error = relative_error(image, previous)
+        logging.info('%d samples per pixel: estimated error %f',
+                     samples, error)
+        if error <= self.target_error:
+          break
+      if samples * 2 > self.max_samples:
+        break
+      # The next pass takes about twice as long as this one.
+      if (self.time_budget is not None and
+          time.time() - start + 2 * pass_time > self.time_budget):
+        break
+      previous = image
+      samples *= 2
+    for path in outputs[:-1]:
+      os.remove(path)
+    if stats is not None:
+      stats['samples_per_pixel'] = samples
+      # Every pass renders from scratch, so all of them count.
+      stats['samples_rendered'] = rendered
+      stats['passes'] = len(outputs)
+      stats['error'] = error
+    return outputs[-1]
@@ -0,0 +1,85 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+
+def frame_key(scene_digest, settings):
+  h = hashlib.sha256()
+  h.update(json.dumps(settings, sort_keys=True).encode())
+  h.update(scene_digest.encode())
+  return h.hexdigest()
+
+
+class FrameCache(object):
+  def __init__(self, path, max_size=2**30):
+    self.path = os.path.expanduser(path)
+    self.max_size = max_size
+    self.size = 0
+    self._lock = threading.Lock()
+    # key -> size in bytes, least recently used first.
+    self._entries = collections.OrderedDict()
+    os.makedirs(self.path, exist_ok=True)
+    self._scan()
+
+  def _scan(self):
+    entries = []
+    for subdir in os.listdir(self.path):
+      subdir_path = os.path.join(self.path, subdir)
+      if not os.path.isdir(subdir_path):
+        continue
+      for key in os.listdir(subdir_path):
+        stat = os.stat(os.path.join(subdir_path, key))
+        entries.append((stat.st_mtime, key, stat.st_size))
+    for _, key, size in sorted(entries):
+      self._entries[key] = size
+      self.size += size
+    logging.info('Frame cache %s: %d frames, %d bytes',
+                 self.path, len(self._entries), self.size)
+
+  def _entry_path(self, key):
+    return os.path.join(self.path, key[:2], key)
+
+  def get(self, key, output_file):
+    with self._lock:
+      if key not in self._entries:
+        return False
+      self._entries.move_to_end(key)
+    path = self._entry_path(key)
+    try:
+      shutil.copyfile(path, output_file)
+      os.utime(path)
+    except FileNotFoundError:
+      # Evicted by another process sharing the directory.
+      with self._lock:
+        self.size -= self._entries.pop(key, 0)
+      return False
+    logging.info('Frame cache hit %s -> %s', key, output_file)
+    return True
+
+  def put(self, key, output_file):
+    path = self._entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    os.close(fd)
+    shutil.copyfile(output_file, tmp_path)
+    os.replace(tmp_path, path)
+    size = os.path.getsize(path)
+    with self._lock:
+      self.size += size - self._entries.pop(key, 0)
+      self._entries[key] = size
+      self._evict()
+
+  def _evict(self):
+    while self.size > self.max_size and len(self._entries) > 1:
+      key, size = self._entries.popitem(last=False)
+      logging.info('Evicting %s from the frame cache', key)
+      self.size -= size
+      try:
+        os.remove(self._entry_path(key))
+      except FileNotFoundError:
+        pass
@@ -1,14 +1,18 @@
+import concurrent.futures
 import logging
 import numpy as np
 import os
-import subprocess
 import tempfile
 
+try:
+  import imageio.v2 as imageio
+except ImportError:
+  import imageio
+
+from . import process
 from . import scene
 from . import rman
-
-
-ZERO = scene.npvector((0, 0, 0))
+from .renderer import SceneRenderer, ZERO, _include
 
 
 _film = rman.Identifier(
@@ -45,6 +49,10 @@ _translate = rman.Identifier('Translate', positional=['vector'])
 
 _rotate = rman.Identifier('Rotate', positional=['float', 'vector'])
 
+_scale = rman.Identifier('Scale', positional=['vector'])
+
+_object_instance = rman.Identifier('ObjectInstance', positional=['string'])
+
 _shape = rman.Identifier(
     'Shape', positional=['string'],
     named={
@@ -54,9 +62,19 @@ _shape = rman.Identifier(
     })
 
 
-class LuxRenderer(object):
+def _stripped_output(output_file):
+  if output_file is None:
+    return None
+  if output_file.endswith('.png'):
+    return output_file[:-4]
+  else:
+    return output_file
+
+
+class LuxRenderer(SceneRenderer):
   def __init__(self, luxconsole=None, output_file=None, scene_file=None,
-               width=384, height=256, samples_per_pixel=10, slaves=None):
+               width=384, height=256, samples_per_pixel=10, slaves=None,
+               threads=None, cache=None, adaptive=None, pipe=False):
     self.luxconsole = luxconsole
     self.output_file = output_file
     self.scene_file = scene_file
@@ -65,85 +83,176 @@ class LuxRenderer(object):
     self.samples_per_pixel = samples_per_pixel
     self.scene_file_ext = 'lxs'
     self.slaves = slaves or []
+    self.threads = threads
+    self.cache = cache
+    # An AdaptiveSampling, which then chooses haltspp of every frame instead
+    # of samples_per_pixel.
+    self.adaptive = adaptive
+    # render() pipes the scene to luxconsole instead of writing a scene
+    # file, unless it is asked to keep one.
+    assert not (pipe and adaptive), 'Adaptive sampling renders scene files'
+    self.pipe = pipe
+    SceneRenderer.__init__(self)
     logging.info('__init__ slaves: %s', slaves)
 
-  def render(self, scene, generate_only=False):
-    scene_file = self.scene_file or tempfile.mkstemp()[1]
-    logging.info('Created scene file %s', scene_file)
-    self._write_scene_file(scene, scene_file)
-
-    if not generate_only:
-      self._run_renderer(scene_file)
-
-    if not self.scene_file:
-      logging.info('Deleting %s', scene_file)
-      os.remove(scene_file)
+  def settings(self):
+    settings = {
+        'renderer': 'luxrender',
+        'luxconsole': self.luxconsole,
+        'width': self.width,
+        'height': self.height,
+        'samples_per_pixel': self.samples_per_pixel,
+    }
+    if self.adaptive is not None:
+      settings['adaptive'] = self.adaptive.settings()
+      del settings['samples_per_pixel']
+    return settings
 
   def _write_object(self, writer, obj):
     writer.begin_block('Attribute')
 
     if obj.light is not None:
-      writer.write(_area_light_source('area', L=obj.light.color, power=obj.light.power))
+      writer.emit(_area_light_source, 'area', L=obj.light.color, power=obj.light.power)
 
     if isinstance(obj, scene.Sphere):
       if not np.array_equal(obj.center, ZERO):
-        writer.write(_translate(obj.center))
-      writer.write(_shape("sphere", radius=obj.radius))
+        writer.emit(_translate, obj.center)
+      writer.emit(_shape, "sphere", radius=obj.radius)
+    elif isinstance(obj, scene.Mesh):
+      writer.emit(_shape, 'trianglemesh', indices=obj.indices, P=obj.points)
+    elif isinstance(obj, scene.Instance):
+      if not np.array_equal(obj.translate, ZERO):
+        writer.emit(_translate, obj.translate)
+      if obj.rotate is not None:
+        writer.emit(_rotate, *obj.rotate)
+      if obj.scale is not None:
+        writer.emit(_scale, obj.scale)
+      writer.emit(_object_instance, obj.name)
     else:
       assert False, "Unsupported object type"
 
     writer.end_block('Attribute')
 
-  def _stripped_output(self):
-    if self.output_file is None:
-      return None
-    if self.output_file.endswith('.png'):
-      return self.output_file[:-4]
-    else:
-      return self.output_file
-
-  def _write_scene_file(self, scene, scene_file):
-    with rman.FileWriter(scene_file) as writer:
-      writer.write(_look_at(scene.camera.loc, scene.camera.to, scene.camera.up))
-      writer.write(_film(
-          'fleximage',
-          xresolution=self.width, yresolution=self.height,
-          haltspp=self.samples_per_pixel, filename=self._stripped_output()))
-      writer.write(_camera('perspective', fov=scene.camera.fov))
-
-      writer.begin_block('World')
-      for obj in scene.objects:
-        self._write_object(writer, obj)
-      writer.end_block('World')
-
-  def _run_renderer(self, scene_file):
-    logging.debug('Output file: `%s`', self.output_file)
+  def _write_header(self, writer, scene, output_file):
+    writer.emit(_look_at, scene.camera.loc, scene.camera.to, scene.camera.up)
+    # In adaptive mode every pass sets the film with its haltspp before
+    # including this file.
+    if self.adaptive is None:
+      writer.write(self._film(self.samples_per_pixel, output_file),
+                   digest=False)
+    writer.emit(_camera, 'perspective', fov=scene.camera.fov)
+
+  def _film(self, samples_per_pixel, output_file):
+    return _film(
+        'fleximage',
+        xresolution=self.width, yresolution=self.height,
+        haltspp=samples_per_pixel, filename=_stripped_output(output_file))
+
+  def raw_output_path(self, output_file):
+    return output_file
+
+  def render_command(self, scene_file, raw_output=None):
     if self.luxconsole is None:
       logging.error(
           'Trying to call LuxRender, but path to luxconsole is not specified.')
     assert self.luxconsole is not None
-    args = [self.luxconsole, scene_file]
-    if self.output_file:
-      args.extend(['-o', os.path.abspath(self._stripped_output())])
+    # With the scene file '-' luxconsole reads the scene from stdin.
+    args = [self.luxconsole]
+    if scene_file:
+      args.append(scene_file)
+    if raw_output:
+      args.extend(['-o', os.path.abspath(_stripped_output(raw_output))])
+    if self.threads:
+      args.extend(['-t', str(self.threads)])
     if self.slaves:
       for s in self.slaves:
         args.extend(['-u', s])
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
+    return args
+
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    output_file = output_file or self.output_file
+    logging.debug('Output file: `%s`', output_file)
+    if self.adaptive is not None:
+      self._render_adaptive(scene_file, output_file, stats)
+      return
+    process.run(self.render_command(scene_file, output_file), stats=stats)
+    if stats is not None:
+      stats['samples_per_pixel'] = self.samples_per_pixel
+      stats['samples_rendered'] = self.samples_per_pixel
+
+  def _render_adaptive(self, scene_file, output_file, stats):
+    base = _stripped_output(output_file)
+
+    def render_pass(samples):
+      # Next to the scene file, which resolves relative includes the same.
+      pass_file = '{}.{}spp.lxs'.format(
+          os.path.splitext(scene_file)[0], samples)
+      pass_output = '{}.{}spp.png'.format(base, samples)
+      with rman.FileWriter(pass_file) as writer:
+        writer.write(self._film(samples, pass_output))
+        writer.emit(_include, os.path.abspath(scene_file))
+      try:
+        process.run(self.render_command(pass_file, pass_output), stats=stats)
+      finally:
+        os.remove(pass_file)
+      return pass_output
+
+    def read_image(path):
+      return imageio.imread(path).astype(np.float32) / 255
+
+    os.replace(self.adaptive.render(render_pass, read_image, stats),
+               output_file)
 
-  def batch_render(self, scene_files):
+  def finish_frame(self, output_file=None, white=None):
+    # LuxRender writes the final image itself.
+    assert white is None, 'LuxRender normalizes single frames'
+    return None
+
+  def batch_render(self, scene_files, output_files=None, workers=1,
+                   stats=None):
+    assert self.adaptive is None, 'Adaptive sampling needs separate renders'
+    # Output files are the ones named in the scene files. Each of up to
+    # `workers` luxconsole processes renders its share of the files as a
+    # queue, loading the renderer only once.
     logging.info('Rendering %d files', len(scene_files))
     if self.luxconsole is None:
       logging.error(
           'Trying to call LuxRender, but path to luxconsole is not specified.')
     assert self.luxconsole is not None
-    list_file = tempfile.mkstemp()[1]
-    lf = open(list_file, 'w+')
-    lf.write('\n'.join(scene_files))
-    lf.close()
-    args = [self.luxconsole, '-L', list_file, '-i', '10']
-    if self.slaves:
-      for s in self.slaves:
-        args.extend(['-u', s])
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
+    stats = stats or [{} for _ in scene_files]
+    lists = [list(range(i, len(scene_files), workers))
+             for i in range(min(workers, len(scene_files)))]
+    list_files = []
+    for frames in lists:
+      list_file = tempfile.mkstemp()[1]
+      list_files.append(list_file)
+      with open(list_file, 'w') as lf:
+        lf.write('\n'.join(scene_files[f] for f in frames))
+
+    def render_list(list_file, frames):
+      args = [self.luxconsole, '-L', list_file, '-i', '10']
+      if self.threads:
+        args.extend(['-t', str(self.threads)])
+      if self.slaves:
+        for s in self.slaves:
+          args.extend(['-u', s])
+      usage = {}
+      process.run(args, stats=usage)
+      # The frames of a list share one process, so they share its usage
+      # equally, apart from the peak memory, which each of them saw.
+      for f in frames:
+        stats[f]['render_time'] = usage['render_time'] / len(frames)
+        stats[f]['render_cpu_time'] = usage['render_cpu_time'] / len(frames)
+        stats[f]['render_max_rss'] = usage['render_max_rss']
+        stats[f]['samples_per_pixel'] = self.samples_per_pixel
+        stats[f]['samples_rendered'] = self.samples_per_pixel
+
+    try:
+      with concurrent.futures.ThreadPoolExecutor(len(lists)) as pool:
+        for future in [pool.submit(render_list, list_file, frames)
+                       for list_file, frames in zip(list_files, lists)]:
+          future.result()
+    finally:
+      for list_file in list_files:
+        os.remove(list_file)
+    return [None] * len(scene_files)
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+def file_sha256(path):
+  h = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+class Manifest(object):
+  # An append-only log of completed frames, one JSON object per line. Each
+  # line is flushed to disk before the frame counts as done, and a truncated
+  # last line left by a crash is ignored when the log is loaded.
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+    self.frames = {}
+    if os.path.exists(path):
+      self._load()
+    self._out = open(path, 'a')
+    if self._out.tell() > 0 and not self._ends_with_newline():
+      self._out.write('\n')
+
+  def _load(self):
+    with open(self.path) as f:
+      for line in f:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          logging.warning('Ignoring a corrupt line in %s', self.path)
+          continue
+        self.frames[entry['frame']] = entry
+    logging.info('Loaded manifest %s with %d completed frames',
+                 self.path, len(self.frames))
+
+  def _ends_with_newline(self):
+    with open(self.path, 'rb') as f:
+      f.seek(-1, os.SEEK_END)
+      return f.read(1) == b'\n'
+
+  def close(self):
+    self._out.close()
+
+  def is_complete(self, frame_path, key):
+    with self._lock:
+      entry = self.frames.get(os.path.basename(frame_path))
+    if entry is None or entry['key'] != key:
+      return False
+    try:
+      if os.path.getsize(frame_path) != entry['size']:
+        return False
+    except FileNotFoundError:
+      return False
+    return file_sha256(frame_path) == entry['sha256']
+
+  def add(self, frame_path, key):
+    entry = {
+        'frame': os.path.basename(frame_path),
+        'key': key,
+        'size': os.path.getsize(frame_path),
+        'sha256': file_sha256(frame_path),
+    }
+    with self._lock:
+      self.frames[entry['frame']] = entry
+      self._out.write(json.dumps(entry, sort_keys=True) + '\n')
+      self._out.flush()
+      os.fsync(self._out.fileno())
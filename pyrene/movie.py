@@ -0,0 +1,263 @@
+import concurrent.futures
+import logging
+import math
+import moviepy.editor as mpy
+import os
+import tempfile
+import time
+
+from . import telemetry
+from . import tonemap
+from .manifest import Manifest
+from .scheduler import LocalWorker, Scheduler
+from .stream import FrameStream
+
+
+class Preview(object):
+  # Settings for a quick look at a movie: scale times the resolution,
+  # samples times the samples per pixel and only every step-th frame, shown
+  # for step frames so the timing stays the same. The final movie is then
+  # rendered with the same renderer and frame function by a Movie without a
+  # preview, and the renderer's cache keeps the two sets of frames apart.
+
+  def __init__(self, scale=0.25, samples=0.1, step=4):
+    assert step >= 1
+    self.scale = scale
+    self.samples = samples
+    self.step = step
+
+
+class Movie(object):
+  def __init__(self, renderer, fps=60, workers=1, lookahead=None,
+               work_dir=None, output=None, keep_frames=True, exposure='frame',
+               exposure_window=15, batch=False, preview=None):
+    # Either a number of local renderer processes or a list of workers from
+    # pyrene.scheduler, e.g. RemoteWorkers rendering on other hosts.
+    if isinstance(workers, int):
+      assert workers >= 1
+      workers = [LocalWorker('local{}'.format(i)) for i in range(workers)]
+    # 'frame' lets the renderer normalize each frame on its own. 'clip'
+    # renders HDR frames and normalizes all frames of a clip together with a
+    # white point smoothed over exposure_window frames.
+    assert exposure in ('frame', 'clip')
+    assert exposure == 'frame' or (
+        hasattr(renderer, 'render_hdr') and
+        getattr(renderer, 'tonemaps_clips', False)), (
+            'Clip exposure needs a renderer with HDR output that tonemaps '
+            'with a given white point')
+    self.exposure = exposure
+    self.exposure_window = exposure_window
+    self._clip_exposure = None
+    self.preview = preview
+    self.step = 1
+    if preview is not None:
+      renderer = renderer.preview(preview.scale, preview.samples)
+      self.step = preview.step
+    self.renderer = renderer
+    self.fps = fps
+    # Frame rate of the video, lower than fps when skipping frames.
+    self.video_fps = fps / self.step
+    self.workers = workers
+    # Number of generated scene files that may wait for a free renderer.
+    self.lookahead = lookahead or 2 * len(workers)
+    # Generate all scene files of a clip first and render them through the
+    # renderer's batch_render instead of frame by frame. Batches run on this
+    # host, with as many processes as there are workers.
+    assert not batch or all(isinstance(worker, LocalWorker)
+                            for worker in workers), (
+        'Batch rendering only runs on local workers')
+    self.batch = batch
+    self.frames = []
+    self.scenes = []
+    # A dict per frame with its timings, filled in by the movie, the workers
+    # and the renderer, e.g. with the number of samples per pixel it took.
+    # See pyrene.telemetry.
+    self.stats = []
+    if work_dir is None:
+      self._tmp_dir = tempfile.TemporaryDirectory()
+      self.dir = self._tmp_dir.name
+      self.manifest = None
+      logging.info('Created a temporary directory %s for frame images.',
+                   self.dir)
+    else:
+      # A named work directory survives the process, and the manifest of
+      # completed frames lets a restarted render skip them.
+      self._tmp_dir = None
+      self.dir = work_dir
+      os.makedirs(self.dir, exist_ok=True)
+      self.manifest = Manifest(os.path.join(self.dir, 'manifest.jsonl'))
+      logging.info('Using work directory %s for frame images.', self.dir)
+    if output is not None:
+      # Frames go to the encoder as soon as they and all earlier frames are
+      # done, instead of being read back by write() after rendering.
+      assert keep_frames or work_dir is None, (
+          'A resumable movie needs to keep its frames')
+      self.stream = FrameStream(output, self.video_fps,
+                                keep_frames=keep_frames)
+    else:
+      self.stream = None
+
+  def __del__(self):
+    # Also runs when __init__ rejected its arguments.
+    if getattr(self, 'manifest', None) is not None:
+      self.manifest.close()
+    if getattr(self, '_tmp_dir', None) is not None:
+      logging.info('Deleting temporary directory %s.', self.dir)
+      self._tmp_dir.cleanup()
+
+  def _new_frame(self):
+    frame_path = os.path.join(
+        self.dir,
+        'f{:05}.png'.format(len(self.frames)))
+    scene_path = os.path.join(
+        self.dir,
+        'f{:05}.{ext}'.format(len(self.scenes),
+                              ext=self.renderer.scene_file_ext))
+    self.scenes.append(scene_path)
+    self.frames.append(frame_path)
+    self.stats.append({})
+    return len(self.frames) - 1, frame_path, scene_path
+
+  def _result_path(self, frame_path):
+    # With clip exposure, the cache and the manifest hold the HDR frames,
+    # since the final images depend on the rest of the clip.
+    if self.exposure == 'clip':
+      return self.renderer.hdr_path(frame_path)
+    return frame_path
+
+  def _frame_key(self, digest):
+    if self.exposure == 'clip':
+      return self.renderer.frame_key(digest, hdr=True)
+    return self.renderer.frame_key(digest)
+
+  def _frame_done(self, index, frame_path, key, rendered=True, resumed=False,
+                  image=None):
+    result_path = self._result_path(frame_path)
+    if rendered and self.renderer.cache is not None:
+      self.renderer.cache.put(key, result_path)
+    if self.manifest is not None and not resumed:
+      self.manifest.add(result_path, key)
+    if self._clip_exposure is not None:
+      self._clip_exposure.add(index, tonemap.read_exr(result_path))
+    elif self.stream is not None:
+      self.stream.add(index, frame_path, image=image, stats=self.stats[index])
+
+  def _finish_clip(self, clip_exposure):
+    whites = clip_exposure.whites()
+
+    def finish(index):
+      frame_path = self.frames[index]
+      start = time.time()
+      image = self.renderer.finish_frame(frame_path, white=whites[index])
+      self.stats[index]['postprocess_time'] = time.time() - start
+      if self.stream is not None:
+        self.stream.add(index, frame_path, image=image,
+                        stats=self.stats[index])
+
+    with concurrent.futures.ThreadPoolExecutor(len(self.workers)) as pool:
+      list(pool.map(finish, sorted(whites)))
+
+  def _render_job(self, worker, job):
+    index, scene_path, frame_path, key = job
+    self.stats[index]['worker'] = worker.name
+    if self._clip_exposure is not None:
+      worker.render(self.renderer, scene_path, frame_path, hdr=True,
+                    stats=self.stats[index])
+      image = None
+    else:
+      # Renderers that post-process in process return the final image, which
+      # saves the encoder from decoding the PNG again.
+      image = worker.render(self.renderer, scene_path, frame_path,
+                            stats=self.stats[index])
+    self._frame_done(index, frame_path, key, image=image)
+
+  def _generate_frame(self, t, frame_func):
+    # Returns the render job for the frame at time t, or None if the frame
+    # is already complete or cached.
+    index, frame_path, scene_path = self._new_frame()
+    start = time.time()
+    scene = frame_func(t)
+    digest = self.renderer.write_scene_file(scene, scene_path, frame_path)
+    self.stats[index]['generate_time'] = time.time() - start
+    self.stats[index]['scene_size'] = os.path.getsize(scene_path)
+    key = self._frame_key(digest)
+    result_path = self._result_path(frame_path)
+    if (self.manifest is not None and
+        self.manifest.is_complete(result_path, key)):
+      logging.info('Frame %s is already complete', frame_path)
+      self.stats[index]['resumed'] = True
+      self._frame_done(index, frame_path, key, rendered=False, resumed=True)
+      return None
+    cache = self.renderer.cache
+    if cache is not None and cache.get(key, result_path):
+      self.stats[index]['cached'] = True
+      self._frame_done(index, frame_path, key, rendered=False)
+      return None
+    return index, scene_path, frame_path, key
+
+  def _render_pipelined(self, times, frame_func):
+    # Scene generation is the producer stage and runs on this thread, in
+    # order, since frame_func may advance a simulation. It stays up to
+    # `lookahead` frames ahead of the renderer stage.
+    scheduler = Scheduler(self.workers, self._render_job, self.lookahead)
+    try:
+      for t in times:
+        job = self._generate_frame(t, frame_func)
+        if job is not None:
+          scheduler.submit(job)
+    finally:
+      scheduler.join()
+
+  def _render_batch(self, times, frame_func):
+    # All scene files are written before the renderer's batch API renders
+    # them with up to `workers` processes.
+    jobs = [job for job in (self._generate_frame(t, frame_func) for t in times)
+            if job is not None]
+    if not jobs:
+      return
+    kwargs = {'hdr': True} if self._clip_exposure is not None else {}
+    results = self.renderer.batch_render(
+        [scene_path for _, scene_path, _, _ in jobs],
+        [frame_path for _, _, frame_path, _ in jobs],
+        workers=len(self.workers),
+        stats=[self.stats[index] for index, _, _, _ in jobs], **kwargs)
+    for (index, _, frame_path, key), result in zip(jobs, results):
+      image = None if self._clip_exposure is not None else result
+      self._frame_done(index, frame_path, key, image=image)
+
+  def render_clip(self, start, end, frame_func):
+    logging.info('Rendering a clip from %f to %f with %d workers',
+                 start, end, len(self.workers))
+    times = [start + f / self.fps
+             for f in range(0, int(math.ceil((end - start) * self.fps)),
+                            self.step)]
+    if self.exposure == 'clip':
+      self._clip_exposure = tonemap.ClipExposure(window=self.exposure_window)
+    first = len(self.frames)
+    try:
+      if self.batch:
+        self._render_batch(times, frame_func)
+      else:
+        self._render_pipelined(times, frame_func)
+      if self._clip_exposure is not None:
+        self._finish_clip(self._clip_exposure)
+    finally:
+      self._clip_exposure = None
+    samples = [stats['samples_per_pixel'] for stats in self.stats[first:]
+               if stats.get('samples_per_pixel')]
+    if samples:
+      logging.info('Rendered %d frames with %.1f samples per pixel on average',
+                   len(samples), sum(samples) / len(samples))
+
+  def write(self, output=None):
+    if self.stream is not None:
+      assert output is None or output == self.stream.output
+      self.stream.close()
+    else:
+      clip = mpy.ImageSequenceClip(self.frames, fps=self.video_fps)
+      clip.write_videofile(output, fps=self.video_fps, audio=False)
+    logging.info('Frame statistics:\n%s', telemetry.summary(self.stats))
+
+  def write_stats(self, path):
+    # Writes the statistics of every frame as CSV or JSON.
+    telemetry.write(path, self.stats)
@@ -1,14 +1,16 @@
+import concurrent.futures
+import hashlib
 import logging
 import numpy as np
 import os
-import subprocess
-import tempfile
+import time
 
+from . import ply
+from . import process
 from . import scene
 from . import rman
-
-
-ZERO = scene.npvector((0, 0, 0))
+from . import tonemap
+from .renderer import SceneRenderer, ZERO, _include
 
 
 _film = rman.Identifier(
@@ -49,19 +51,34 @@ _translate = rman.Identifier('Translate', positional=['vector'])
 
 _rotate = rman.Identifier('Rotate', positional=['float', 'vector'])
 
+_scale = rman.Identifier('Scale', positional=['vector'])
+
+_object_instance = rman.Identifier('ObjectInstance', positional=['string'])
+
 _shape = rman.Identifier(
     'Shape', positional=['string'],
     named={
         'radius': 'float',
         'indices': 'integer[]',
-        'P': 'point[]'
+        'P': 'point[]',
+        'filename': 'string'
     })
 
 
-class PbrtRenderer(object):
+def _exr_path(output_file):
+  if output_file is None:
+    return None
+  base, ext = os.path.splitext(output_file)
+  assert ext == '.png', 'pbrt output file must be a .png'
+  return base + '.exr'
+
+
+class PbrtRenderer(SceneRenderer):
   def __init__(self, executable=None, output_file=None, scene_file=None,
                width=384, height=256, samples_per_pixel=None, slaves=None,
-               exrpptm=None, exrnormalize=None, exrtopng=None):
+               exrpptm=None, exrnormalize=None, exrtopng=None, threads=None,
+               cache=None, postprocess='numpy', adaptive=None,
+               ply_triangles=None, pipe=False):
     self.executable = executable
     self.output_file = output_file
     self.scene_file = scene_file
@@ -72,6 +89,23 @@ class PbrtRenderer(object):
     self.exrpptm = exrpptm
     self.exrnormalize = exrnormalize
     self.exrtopng = exrtopng
+    # 'numpy' tonemaps the EXR in process, 'exrtools' runs exrpptm,
+    # exrnormalize and exrtopng.
+    assert postprocess in ('numpy', 'exrtools')
+    self.postprocess = postprocess
+    self.threads = threads
+    self.cache = cache
+    # An AdaptiveSampling, which then chooses the samples per pixel of every
+    # frame instead of samples_per_pixel.
+    self.adaptive = adaptive
+    # render() pipes the scene to pbrt instead of writing a scene file,
+    # unless it is asked to keep one.
+    assert not (pipe and adaptive), 'Adaptive sampling renders scene files'
+    self.pipe = pipe
+    # Meshes with at least this many triangles go to binary PLY files next
+    # to the scene file, which pbrt loads much faster than text.
+    self.ply_triangles = ply_triangles
+    SceneRenderer.__init__(self)
 
   @property
   def output_file(self):
@@ -80,80 +114,172 @@ class PbrtRenderer(object):
   @output_file.setter
   def output_file(self, value):
     logging.info('output_file = %s', value)
-    if value is None:
-      self._output_file = None
-      self._exr_file = None
-      return
+    if value is not None:
+      _exr_path(value)
     self._output_file = value
-    base, ext = os.path.splitext(value)
-    logging.info('base = %s, ext = %s', base, ext)
-    assert ext == '.png'
-    self._exr_file = base + '.exr'
-
-  def render(self, scene, generate_only=False):
-    scene_file = self.scene_file or tempfile.mkstemp()[1]
-    logging.info('Created scene file %s', scene_file)
-    self._write_scene_file(scene, scene_file)
-
-    if not generate_only:
-      self._run_renderer(scene_file)
 
-    if not self.scene_file:
-      logging.info('Deleting %s', scene_file)
-      os.remove(scene_file)
+  def settings(self):
+    settings = {
+        'renderer': 'pbrt',
+        'executable': self.executable,
+        'width': self.width,
+        'height': self.height,
+        'samples_per_pixel': self.samples_per_pixel,
+        'postprocess': self.postprocess,
+    }
+    if self.adaptive is not None:
+      settings['adaptive'] = self.adaptive.settings()
+      del settings['samples_per_pixel']
+    if self.postprocess == 'exrtools':
+      settings.update(exrpptm=self.exrpptm, exrnormalize=self.exrnormalize,
+                      exrtopng=self.exrtopng)
+    return settings
 
   def _write_object(self, writer, obj):
     writer.begin_block('Attribute')
 
     if obj.light is not None:
       color = obj.light.color * obj.light.power
-      writer.write(_area_light_source('diffuse', L=obj.light.color))
+      writer.emit(_area_light_source, 'diffuse', L=obj.light.color)
 
     if isinstance(obj, scene.Sphere):
       if not np.array_equal(obj.center, ZERO):
-        writer.write(_translate(obj.center))
-      writer.write(_shape("sphere", radius=obj.radius))
+        writer.emit(_translate, obj.center)
+      writer.emit(_shape, "sphere", radius=obj.radius)
+    elif isinstance(obj, scene.Mesh):
+      if (self.ply_triangles is not None and
+          len(obj.indices) >= self.ply_triangles):
+        self._write_ply_mesh(writer, obj)
+      else:
+        writer.emit(_shape, 'trianglemesh', indices=obj.indices, P=obj.points)
+    elif isinstance(obj, scene.Instance):
+      if not np.array_equal(obj.translate, ZERO):
+        writer.emit(_translate, obj.translate)
+      if obj.rotate is not None:
+        writer.emit(_rotate, *obj.rotate)
+      if obj.scale is not None:
+        writer.emit(_scale, obj.scale)
+      writer.emit(_object_instance, obj.name)
     else:
       assert False, "Unsupported object type"
 
     writer.end_block('Attribute')
 
-  def _write_scene_file(self, scene, scene_file):
-    with rman.FileWriter(scene_file) as writer:
-      writer.write(_look_at(scene.camera.loc, scene.camera.to, scene.camera.up))
-      writer.write(_film(
-          'image',
-          xresolution=self.width, yresolution=self.height,
-          filename=self._exr_file))
-      writer.write(_camera('perspective', fov=scene.camera.fov))
-      if self.samples_per_pixel:
-        writer.write(_sampler('lowdiscrepancy', pixelsamples=self.samples_per_pixel))
-
-      writer.begin_block('World')
-      for obj in scene.objects:
-        self._write_object(writer, obj)
-      writer.end_block('World')
-
-  def _run_renderer(self, scene_file):
+  def _write_ply_mesh(self, writer, mesh):
+    buffers = ply.encode(mesh.points, mesh.indices)
+    digest = hashlib.sha256()
+    for buf in buffers:
+      digest.update(buf)
+    digest = digest.hexdigest()
+    # Named after its contents, so meshes that don't change between frames
+    # are written only once.
+    path = os.path.join(writer.directory, 'mesh-{}.ply'.format(digest[:16]))
+    if not os.path.exists(path):
+      ply.write(path, buffers)
+    writer.write_reference(
+        _shape('plymesh', filename=os.path.basename(path)), path, digest)
+
+  def _write_header(self, writer, scene, output_file):
+    writer.emit(_look_at, scene.camera.loc, scene.camera.to, scene.camera.up)
+    writer.write(_film(
+        'image',
+        xresolution=self.width, yresolution=self.height,
+        filename=_exr_path(output_file)), digest=False)
+    writer.emit(_camera, 'perspective', fov=scene.camera.fov)
+    # In adaptive mode every pass sets the sampler before including this
+    # file.
+    if self.samples_per_pixel and self.adaptive is None:
+      writer.emit(_sampler, 'lowdiscrepancy', pixelsamples=self.samples_per_pixel)
+
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    output_file = output_file or self.output_file
+    self.render_hdr(scene_file, output_file, stats=stats)
+    start = time.time()
+    image = self.finish_frame(output_file)
+    if stats is not None:
+      stats['postprocess_time'] = time.time() - start
+    return image
+
+  def hdr_path(self, output_file):
+    return _exr_path(output_file)
+
+  def raw_output_path(self, output_file):
+    return _exr_path(output_file)
+
+  def render_command(self, scene_file, raw_output=None):
     if self.executable is None:
       logging.error(
           'Trying to call pbrt, but path to the executable is not specified.')
     assert self.executable is not None
-    args = [self.executable, scene_file]
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
-
-    args = [self.exrpptm, '-c', '1.0', self._exr_file, self._exr_file + '.pp']
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
-    args = [self.exrnormalize, self._exr_file + '.pp', self._exr_file + '.n']
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
-    args = [self.exrtopng, self._exr_file + '.n', self.output_file]
-    logging.info('Running %s', ' '.join(args))
-    subprocess.call(args)
-
-  def batch_render(self, scene_files):
+    # With the scene file '-' pbrt reads the scene from stdin.
+    args = [self.executable]
+    if scene_file:
+      args.append(scene_file)
+    if raw_output:
+      args.extend(['--outfile', raw_output])
+    if self.threads:
+      args.extend(['--nthreads', str(self.threads)])
+    return args
+
+  def render_hdr(self, scene_file, output_file=None, stats=None):
+    output_file = output_file or self.output_file
+    exr_file = _exr_path(output_file)
+    if self.adaptive is not None:
+      self._render_adaptive(scene_file, exr_file, stats)
+      return exr_file
+    process.run(self.render_command(scene_file, exr_file), stats=stats)
+    if stats is not None:
+      stats['samples_per_pixel'] = self.samples_per_pixel
+      stats['samples_rendered'] = self.samples_per_pixel
+    return exr_file
+
+  def _render_adaptive(self, scene_file, exr_file, stats):
+    base = os.path.splitext(exr_file)[0]
+
+    def render_pass(samples):
+      # Next to the scene file, which resolves relative includes the same.
+      pass_file = '{}.{}spp.pbrt'.format(
+          os.path.splitext(scene_file)[0], samples)
+      pass_output = '{}.{}spp.exr'.format(base, samples)
+      with rman.FileWriter(pass_file) as writer:
+        writer.emit(_sampler, 'lowdiscrepancy', pixelsamples=samples)
+        writer.emit(_include, os.path.abspath(scene_file))
+      try:
+        process.run(self.render_command(pass_file, pass_output), stats=stats)
+      finally:
+        os.remove(pass_file)
+      return pass_output
+
+    os.replace(self.adaptive.render(render_pass, tonemap.read_exr, stats),
+               exr_file)
+
+  @property
+  def tonemaps_clips(self):
+    # Whether finish_frame takes a white point from outside, which Movie's
+    # clip exposure needs. exrnormalize only normalizes single frames.
+    return self.postprocess == 'numpy'
+
+  def finish_frame(self, output_file=None, white=None):
+    output_file = output_file or self.output_file
+    exr_file = _exr_path(output_file)
+    if self.postprocess == 'numpy':
+      logging.info('Tonemapping %s', exr_file)
+      return tonemap.postprocess(exr_file, output_file, white=white)
+
+    assert white is None, 'exrnormalize only normalizes single frames'
+    args = [self.exrpptm, '-c', '1.0', exr_file, exr_file + '.pp']
+    process.run(args)
+    args = [self.exrnormalize, exr_file + '.pp', exr_file + '.n']
+    process.run(args)
+    args = [self.exrtopng, exr_file + '.n', output_file]
+    process.run(args)
+
+  def batch_render(self, scene_files, output_files=None, workers=1,
+                   hdr=False, stats=None):
     logging.info('Rendering %d files', len(scene_files))
-    for f in scene_files:
-      self._run_renderer(f)
+    output_files = output_files or [self.output_file] * len(scene_files)
+    stats = stats or [None] * len(scene_files)
+    render = self.render_hdr if hdr else self.render_scene_file
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+      return list(pool.map(lambda f, o, s: render(f, o, stats=s),
+                           scene_files, output_files, stats))
@@ -0,0 +1,53 @@
+import numpy as np
+import os
+import tempfile
+
+
+_FACE = np.dtype([('count', 'u1'), ('indices', '<i4', (3,))])
+
+
+def encode(points, indices):
+  # Returns a binary little-endian PLY file holding a triangle mesh as a list
+  # of buffers, which share memory with the arrays where possible.
+  vertices = np.ascontiguousarray(points, dtype='<f4')
+  faces = np.empty(len(indices), dtype=_FACE)
+  faces['count'] = 3
+  faces['indices'] = indices
+  header = '\n'.join([
+      'ply',
+      'format binary_little_endian 1.0',
+      'element vertex {}'.format(len(vertices)),
+      'property float x',
+      'property float y',
+      'property float z',
+      'element face {}'.format(len(faces)),
+      'property list uchar int vertex_indices',
+      'end_header',
+      ''])
+  return [header.encode('ascii'), memoryview(vertices), memoryview(faces)]
+
+
+def write(path, buffers):
+  # Writes to a temporary file first, so that path is always complete.
+  fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+  with os.fdopen(fd, 'wb') as f:
+    for buf in buffers:
+      f.write(buf)
+  os.replace(tmp_path, path)
+
+
+def read(path):
+  # Reads a mesh written by write.
+  with open(path, 'rb') as f:
+    data = f.read()
+  end = data.index(b'end_header\n') + len(b'end_header\n')
+  counts = {}
+  for line in data[:end].decode('ascii').splitlines():
+    if line.startswith('element'):
+      _, name, count = line.split()
+      counts[name] = int(count)
+  vertices = np.frombuffer(data, dtype='<f4', count=3 * counts['vertex'],
+                           offset=end).reshape(-1, 3)
+  faces = np.frombuffer(data, dtype=_FACE, count=counts['face'],
+                        offset=end + vertices.nbytes)
+  return vertices, faces['indices']
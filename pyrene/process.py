@@ -0,0 +1,45 @@
+import logging
+import os
+import subprocess
+import time
+
+
+class RenderError(Exception):
+  pass
+
+
+def run(args, input=None, stats=None, **kwargs):
+  # input, if given, is written to the process's stdin. stats, if given, is
+  # a dict which adds up the wall and CPU time of the process in
+  # render_time and render_cpu_time and keeps its peak memory use in bytes
+  # in render_max_rss.
+  logging.info('Running %s', ' '.join(args))
+  start = time.time()
+  proc = subprocess.Popen(
+      args, stdin=None if input is None else subprocess.PIPE, **kwargs)
+  if input is not None:
+    try:
+      proc.stdin.write(input)
+    except BrokenPipeError:
+      # The process exited early, its status tells why.
+      pass
+    try:
+      proc.stdin.close()
+    except BrokenPipeError:
+      pass
+  # Unlike Popen.wait, wait4 reports the resource usage of the process.
+  _, status, rusage = os.wait4(proc.pid, 0)
+  if os.WIFSIGNALED(status):
+    returncode = -os.WTERMSIG(status)
+  else:
+    returncode = os.WEXITSTATUS(status)
+  proc.returncode = returncode
+  if stats is not None:
+    stats['render_time'] = stats.get('render_time', 0) + time.time() - start
+    stats['render_cpu_time'] = (stats.get('render_cpu_time', 0) +
+                                rusage.ru_utime + rusage.ru_stime)
+    # ru_maxrss is in kilobytes on Linux.
+    stats['render_max_rss'] = max(stats.get('render_max_rss', 0),
+                                  rusage.ru_maxrss * 1024)
+  if returncode != 0:
+    raise RenderError('{} exited with status {}'.format(args[0], returncode))
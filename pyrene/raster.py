@@ -0,0 +1,381 @@
+import concurrent.futures
+import copy
+import hashlib
+import logging
+import math
+import numpy as np
+import os
+import tempfile
+import time
+
+try:
+  import imageio.v2 as imageio
+except ImportError:
+  import imageio
+
+from . import cache
+from . import scene
+from . import tonemap
+
+
+# Nearest distance along the view direction that is drawn.
+_NEAR = 1e-3
+
+# Share of the light every surface gets regardless of the lights.
+_AMBIENT = 0.1
+
+# Antialiasing beyond this many samples per pixel side costs a lot of memory
+# and adds little to a preview.
+_MAX_GRID = 2
+
+
+def _rotation(angle, axis):
+  axis = axis / np.linalg.norm(axis)
+  x, y, z = axis
+  c = math.cos(math.radians(angle))
+  s = math.sin(math.radians(angle))
+  cross = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+  return c * np.identity(3) + s * cross + (1 - c) * np.outer(axis, axis)
+
+
+class _Geometry(object):
+  # A scene flattened into arrays: spheres, triangles and their colors, with
+  # a color of NaN for surfaces that don't emit light.
+
+  def __init__(self):
+    self.centers = []
+    self.radii = []
+    self.sphere_colors = []
+    self.triangles = []
+    self.triangle_colors = []
+
+  def add_world(self, world, definitions, matrix=None, offset=None):
+    for obj in world.objects:
+      self.add(obj, definitions, matrix, offset)
+
+  def add(self, obj, definitions, matrix=None, offset=None):
+    def transform(points):
+      if matrix is not None:
+        points = points.dot(matrix.T)
+      if offset is not None:
+        points = points + offset
+      return points
+
+    scale = 1.0 if matrix is None else np.abs(np.linalg.det(matrix)) ** (1 / 3)
+    if isinstance(obj, scene.SphereSet):
+      self.centers.append(transform(obj.centers))
+      self.radii.append(obj.radii * scale)
+      colors = np.full((len(obj), 3), np.nan)
+      if obj.light_indices is not None:
+        for i in np.flatnonzero(obj.light_indices >= 0):
+          colors[i] = obj.light(i).color
+      self.sphere_colors.append(colors)
+    elif isinstance(obj, scene.Sphere):
+      self.centers.append(transform(obj.center[np.newaxis]))
+      self.radii.append(np.array([obj.radius * scale]))
+      self.sphere_colors.append(self._colors(obj, 1))
+    elif isinstance(obj, scene.Mesh):
+      self.triangles.append(transform(obj.points)[obj.indices])
+      self.triangle_colors.append(self._colors(obj, len(obj.indices)))
+    elif isinstance(obj, scene.Instance):
+      m = np.identity(3)
+      if obj.scale is not None:
+        m = np.diag(obj.scale)
+      if obj.rotate is not None:
+        m = _rotation(*obj.rotate).dot(m)
+      o = obj.translate
+      if matrix is not None:
+        o = matrix.dot(o)
+        m = matrix.dot(m)
+      if offset is not None:
+        o = o + offset
+      for child in definitions[obj.name]:
+        self.add(child, definitions, m, o)
+    else:
+      assert False, 'Unsupported object type'
+
+  @staticmethod
+  def _colors(obj, n):
+    color = np.nan if obj.light is None else obj.light.color
+    return np.broadcast_to(color, (n, 3)).astype('float64')
+
+  def arrays(self):
+    def concatenate(arrays, shape):
+      return np.concatenate(arrays) if arrays else np.zeros((0,) + shape)
+
+    return {
+        'centers': concatenate(self.centers, (3,)),
+        'radii': concatenate(self.radii, ()),
+        'sphere_colors': concatenate(self.sphere_colors, (3,)),
+        'triangles': concatenate(self.triangles, (3, 3)),
+        'triangle_colors': concatenate(self.triangle_colors, (3,)),
+    }
+
+
+class RasterRenderer(object):
+  # Draws scenes in process with a NumPy z-buffer, for checking the layout,
+  # camera paths and motion of a movie before path tracing it. Surfaces are
+  # lit by the emissive spheres and triangles as point lights at their
+  # centers, without shadows, and emissive surfaces show their color.
+  # samples_per_pixel is rounded to a square grid of at most
+  # _MAX_GRID x _MAX_GRID samples per pixel.
+
+  def __init__(self, output_file=None, scene_file=None, width=384, height=256,
+               samples_per_pixel=1, threads=None, cache=None):
+    self.output_file = output_file
+    self.scene_file = scene_file
+    self.width = width
+    self.height = height
+    self.samples_per_pixel = samples_per_pixel
+    self.scene_file_ext = 'npz'
+    self.threads = threads
+    self.cache = cache
+    self.adaptive = None
+
+  def settings(self):
+    return {
+        'renderer': 'raster',
+        'width': self.width,
+        'height': self.height,
+        'samples_per_pixel': self.samples_per_pixel,
+    }
+
+  def frame_key(self, scene_digest):
+    return cache.frame_key(scene_digest, self.settings())
+
+  def preview(self, scale=0.25, samples=0.1):
+    renderer = copy.copy(self)
+    renderer.width = max(1, int(round(self.width * scale)))
+    renderer.height = max(1, int(round(self.height * scale)))
+    renderer.samples_per_pixel = 1
+    return renderer
+
+  def includes(self, scene_file):
+    return []
+
+  def render(self, scene, generate_only=False, output_file=None,
+             scene_file=None):
+    output_file = output_file or self.output_file
+    keep_scene_file = scene_file or self.scene_file
+    scene_file = keep_scene_file or tempfile.mkstemp()[1]
+    logging.info('Created scene file %s', scene_file)
+    digest = self.write_scene_file(scene, scene_file, output_file)
+
+    if not generate_only:
+      key = self.frame_key(digest)
+      if self.cache is None or not self.cache.get(key, output_file):
+        self.render_scene_file(scene_file, output_file)
+        if self.cache is not None:
+          self.cache.put(key, output_file)
+
+    if not keep_scene_file:
+      logging.info('Deleting %s', scene_file)
+      os.remove(scene_file)
+
+  def write_scene_file(self, scene, scene_file, output_file=None):
+    # The scene file holds the scene flattened into arrays.
+    geometry = _Geometry()
+    definitions = dict(scene.definitions)
+    if scene.static is not None:
+      definitions.update(scene.static.definitions)
+      geometry.add_world(scene.static, definitions)
+    geometry.add_world(scene, definitions)
+    arrays = geometry.arrays()
+    camera = scene.camera
+    arrays['camera'] = np.concatenate(
+        [camera.loc, camera.to, camera.up, [camera.fov]])
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+      digest.update(name.encode())
+      digest.update(np.ascontiguousarray(arrays[name], dtype='float64'))
+    # A file object, since savez would add .npz to other file names.
+    with open(scene_file, 'wb') as f:
+      np.savez(f, **arrays)
+    return digest.hexdigest()
+
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    output_file = output_file or self.output_file
+    start = time.time()
+    with np.load(scene_file) as arrays:
+      arrays = dict(arrays)
+    grid = max(1, min(int(round(math.sqrt(self.samples_per_pixel or 1))),
+                      _MAX_GRID))
+    image = _Raster(arrays, self.width * grid, self.height * grid).draw()
+    if grid > 1:
+      image = image.reshape(self.height, grid, self.width, grid, 3).mean(
+          axis=(1, 3))
+    image = tonemap.quantize(image)
+    if output_file is not None:
+      imageio.imwrite(output_file, image)
+    if stats is not None:
+      stats['samples_per_pixel'] = grid * grid
+      stats['samples_rendered'] = grid * grid
+      stats['render_time'] = time.time() - start
+    return image
+
+  def finish_frame(self, output_file=None, white=None):
+    # Frames are complete once rendered.
+    assert white is None, 'The raster renderer draws final frames'
+    return None
+
+  def batch_render(self, scene_files, output_files=None, workers=1,
+                   stats=None):
+    logging.info('Rendering %d files', len(scene_files))
+    output_files = output_files or [self.output_file] * len(scene_files)
+    stats = stats or [None] * len(scene_files)
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+      return list(pool.map(
+          lambda f, o, s: self.render_scene_file(f, o, stats=s),
+          scene_files, output_files, stats))
+
+
+class _Raster(object):
+  def __init__(self, arrays, width, height):
+    self.arrays = arrays
+    self.width = width
+    self.height = height
+    camera = arrays['camera']
+    self.loc, to, up = camera[0:3], camera[3:6], camera[6:9]
+    # Camera frame, with the field of view across the shorter side as in
+    # pbrt.
+    self.forward = (to - self.loc) / np.linalg.norm(to - self.loc)
+    self.right = np.cross(self.forward, up)
+    self.right /= np.linalg.norm(self.right)
+    self.up = np.cross(self.right, self.forward)
+    tan = math.tan(math.radians(camera[9]) / 2)
+    short = min(width, height)
+    self.tan_x = tan * width / short
+    self.tan_y = tan * height / short
+    # Ray directions through pixel centers, scaled to unit depth, so that
+    # distances along them are depths.
+    x = ((np.arange(width) + 0.5) / width * 2 - 1) * self.tan_x
+    y = (1 - (np.arange(height) + 0.5) / height * 2) * self.tan_y
+    self.rays = (self.forward + x[np.newaxis, :, np.newaxis] * self.right +
+                 y[:, np.newaxis, np.newaxis] * self.up)
+    self.depth = np.full((height, width), np.inf)
+    self.image = np.zeros((height, width, 3))
+    self._lights()
+
+  def _lights(self):
+    colors = np.concatenate([self.arrays['sphere_colors'],
+                             self.arrays['triangle_colors']])
+    positions = np.concatenate([self.arrays['centers'],
+                                self.arrays['triangles'].mean(axis=1)])
+    emissive = ~np.isnan(colors[:, 0])
+    self.light_positions = positions[emissive]
+    self.light_colors = colors[emissive]
+
+  def _shade(self, points, normals, color):
+    if not np.isnan(color[0]):
+      return np.broadcast_to(color, points.shape)
+    if not len(self.light_positions):
+      # Without lights, light comes from the camera.
+      to_light = self.loc - points
+      to_light /= np.linalg.norm(to_light, axis=-1, keepdims=True)
+      return _AMBIENT + (1 - _AMBIENT) * np.abs(
+          np.sum(normals * to_light, axis=-1))[..., np.newaxis] * np.ones(3)
+    light = np.full(points.shape, _AMBIENT)
+    for position, light_color in zip(self.light_positions, self.light_colors):
+      to_light = position - points
+      to_light /= np.linalg.norm(to_light, axis=-1, keepdims=True)
+      cos = np.maximum(np.sum(normals * to_light, axis=-1), 0)
+      light += (1 - _AMBIENT) * cos[..., np.newaxis] * light_color
+    return np.minimum(light, 1)
+
+  def _project(self, points):
+    # Camera space x, y and depth of points.
+    p = points - self.loc
+    return p.dot(self.right), p.dot(self.up), p.dot(self.forward)
+
+  def _box(self, x_min, x_max, y_min, y_max):
+    # Pixel rows and columns covering the view space box, or None.
+    j0 = int(math.floor((x_min / self.tan_x + 1) / 2 * self.width))
+    j1 = int(math.ceil((x_max / self.tan_x + 1) / 2 * self.width))
+    i0 = int(math.floor((1 - y_max / self.tan_y) / 2 * self.height))
+    i1 = int(math.ceil((1 - y_min / self.tan_y) / 2 * self.height))
+    j0, j1 = max(j0, 0), min(j1, self.width)
+    i0, i1 = max(i0, 0), min(i1, self.height)
+    if j0 >= j1 or i0 >= i1:
+      return None
+    return slice(i0, i1), slice(j0, j1)
+
+  def _update(self, box, t, points, normals, color):
+    depth = self.depth[box]
+    visible = t < depth
+    if not visible.any():
+      return
+    depth[visible] = t[visible]
+    self.image[box][visible] = self._shade(
+        points[visible], normals[visible], color)
+
+  def draw(self):
+    x, y, z = self._project(self.arrays['centers'])
+    for i, radius in enumerate(self.arrays['radii']):
+      self._draw_sphere(self.arrays['centers'][i], radius, x[i], y[i], z[i],
+                        self.arrays['sphere_colors'][i])
+    for triangle, color in zip(self.arrays['triangles'],
+                               self.arrays['triangle_colors']):
+      self._draw_triangle(triangle, color)
+    return self.image
+
+  def _draw_sphere(self, center, radius, x, y, z, color):
+    if z + radius <= _NEAR:
+      return
+    if z - radius <= _NEAR:
+      # The camera is inside or next to the sphere.
+      box = slice(0, self.height), slice(0, self.width)
+    else:
+      # Any point of the sphere projects between these corners.
+      xs = [(x - radius) / (z - radius), (x - radius) / (z + radius),
+            (x + radius) / (z - radius), (x + radius) / (z + radius)]
+      ys = [(y - radius) / (z - radius), (y - radius) / (z + radius),
+            (y + radius) / (z - radius), (y + radius) / (z + radius)]
+      box = self._box(min(xs), max(xs), min(ys), max(ys))
+      if box is None:
+        return
+    rays = self.rays[box]
+    oc = self.loc - center
+    a = np.sum(rays * rays, axis=-1)
+    b = 2 * rays.dot(oc)
+    c = oc.dot(oc) - radius * radius
+    disc = b * b - 4 * a * c
+    hit = disc >= 0
+    sqrt = np.sqrt(np.where(hit, disc, 0))
+    t = (-b - sqrt) / (2 * a)
+    # From inside the sphere, the far side is visible.
+    t = np.where(t > _NEAR, t, (-b + sqrt) / (2 * a))
+    t = np.where(hit & (t > _NEAR), t, np.inf)
+    points = self.loc + t[..., np.newaxis] * rays
+    normals = (points - center) / radius
+    self._update(box, t, points, normals, color)
+
+  def _draw_triangle(self, triangle, color):
+    x, y, z = self._project(triangle)
+    if np.any(z <= _NEAR):
+      # Triangles crossing the near plane are left out of previews.
+      return
+    sx, sy = x / z, y / z
+    box = self._box(sx.min(), sx.max(), sy.min(), sy.max())
+    if box is None:
+      return
+    rays = self.rays[box]
+    # Ray-plane intersection and barycentric coordinates.
+    e1 = triangle[1] - triangle[0]
+    e2 = triangle[2] - triangle[0]
+    normal = np.cross(e1, e2)
+    area = np.linalg.norm(normal)
+    if area == 0:
+      return
+    normal /= area
+    denom = rays.dot(normal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      t = (triangle[0] - self.loc).dot(normal) / denom
+    points = self.loc + t[..., np.newaxis] * rays
+    rel = points - triangle[0]
+    u = np.cross(rel, e2).dot(normal) / area
+    v = np.cross(e1, rel).dot(normal) / area
+    inside = (u >= 0) & (v >= 0) & (u + v <= 1) & (t > _NEAR)
+    t = np.where(inside, t, np.inf)
+    # Both sides face the camera.
+    normals = np.where((denom < 0)[..., np.newaxis], normal, -normal)
+    self._update(box, t, points, normals, color)
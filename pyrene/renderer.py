@@ -0,0 +1,186 @@
+import copy
+import logging
+import numpy as np
+import os
+import tempfile
+import weakref
+
+from . import cache
+from . import process
+from . import rman
+from . import scene
+
+
+ZERO = scene.npvector((0, 0, 0))
+
+
+_include = rman.Identifier('Include', positional=['string'])
+
+
+# A non-emissive sphere away from the origin, exactly as _write_object writes
+# it, with placeholders for the center and the radius.
+_SPHERE_BLOCK = (
+    'AttributeBegin\n'
+    '  Translate  %f %f %f\n'
+    '  Shape  "sphere"  "float radius" [%f]\n'
+    'AttributeEnd\n')
+
+
+class SceneRenderer(object):
+  # Base of the renderers that read scenes in the format pbrt and LuxRender
+  # share. It writes the world, static includes and whole scene files, and
+  # renders scenes through the frame cache. A backend provides
+  # scene_file_ext, settings, _write_header for the camera and film,
+  # _write_object for single objects, render_command, raw_output_path,
+  # render_scene_file and finish_frame.
+
+  def __init__(self):
+    # Files written for static worlds, by World and directory, and the
+    # files each scene file refers to.
+    self._static_files = weakref.WeakKeyDictionary()
+    self._includes = {}
+
+  def preview(self, scale=0.25, samples=0.1):
+    # A copy of this renderer with scale times the resolution and samples
+    # times the samples per pixel. Adaptive sampling gives way to its
+    # minimum number of samples.
+    renderer = copy.copy(self)
+    renderer.width = max(1, int(round(self.width * scale)))
+    renderer.height = max(1, int(round(self.height * scale)))
+    samples_per_pixel = self.samples_per_pixel
+    if self.adaptive is not None:
+      samples_per_pixel = self.adaptive.min_samples
+      renderer.adaptive = None
+    if samples_per_pixel:
+      renderer.samples_per_pixel = max(
+          1, int(round(samples_per_pixel * samples)))
+    renderer._includes = {}
+    return renderer
+
+  def frame_key(self, scene_digest, hdr=False):
+    settings = self.settings()
+    if hdr:
+      settings['output'] = 'exr'
+    return cache.frame_key(scene_digest, settings)
+
+  def render(self, scene, generate_only=False, output_file=None,
+             scene_file=None):
+    output_file = output_file or self.output_file
+    keep_scene_file = scene_file or self.scene_file
+    if self.pipe and not generate_only and not keep_scene_file:
+      self._render_piped(scene, output_file)
+      return
+    scene_file = keep_scene_file or tempfile.mkstemp()[1]
+    logging.info('Created scene file %s', scene_file)
+    digest = self.write_scene_file(scene, scene_file, output_file)
+
+    if not generate_only:
+      key = self.frame_key(digest)
+      if self.cache is None or not self.cache.get(key, output_file):
+        self.render_scene_file(scene_file, output_file)
+        if self.cache is not None:
+          self.cache.put(key, output_file)
+
+    if not keep_scene_file:
+      logging.info('Deleting %s', scene_file)
+      os.remove(scene_file)
+
+  def _render_piped(self, scene, output_file):
+    # The renderer reads the scene from stdin, given as the scene file '-',
+    # and runs in the output directory, where the files the scene refers to
+    # are written.
+    directory = os.path.dirname(os.path.abspath(output_file))
+    with rman.FileWriter(None, directory) as writer:
+      self._write_scene(writer, scene, output_file)
+    key = self.frame_key(writer.hexdigest())
+    if self.cache is not None and self.cache.get(key, output_file):
+      return
+    raw_output = os.path.abspath(self.raw_output_path(output_file))
+    process.run(self.render_command('-', raw_output),
+                input=writer.getvalue().encode(), cwd=directory)
+    self.finish_frame(output_file)
+    if self.cache is not None:
+      self.cache.put(key, output_file)
+
+  def _write_objects(self, writer, objects):
+    # Runs of plain spheres, which make up most of large scenes, and sphere
+    # sets are formatted together from arrays.
+    run = []
+
+    def flush():
+      if run:
+        rows = np.empty((len(run), 4))
+        rows[:, :3] = [obj.center for obj in run]
+        rows[:, 3] = [obj.radius for obj in run]
+        writer.emit_rows(_SPHERE_BLOCK, rows)
+        del run[:]
+
+    for obj in objects:
+      if (type(obj) is scene.Sphere and obj.light is None and
+          not np.array_equal(obj.center, ZERO)):
+        run.append(obj)
+      elif isinstance(obj, scene.SphereSet):
+        flush()
+        self._write_sphere_set(writer, obj)
+      else:
+        flush()
+        self._write_object(writer, obj)
+    flush()
+
+  def _write_sphere_set(self, writer, spheres):
+    rows = np.column_stack([spheres.centers, spheres.radii])
+    start = 0
+    for i in np.flatnonzero(~spheres.plain()):
+      writer.emit_rows(_SPHERE_BLOCK, rows[start:i])
+      self._write_object(writer, spheres.sphere(i))
+      start = i + 1
+    writer.emit_rows(_SPHERE_BLOCK, rows[start:])
+
+  def _write_world(self, writer, world):
+    for name, objects in world.definitions.items():
+      writer.begin_block('Object', name)
+      self._write_objects(writer, objects)
+      writer.end_block('Object')
+    self._write_objects(writer, world.objects)
+
+  def _static_file(self, world, directory):
+    # Returns the path and the digest of the file holding world in
+    # directory, and the files that one refers to, writing it the first
+    # time. The file is named after its digest, so a resumed movie finds the
+    # same file again.
+    files = self._static_files.setdefault(world, {})
+    if directory not in files:
+      fd, tmp_path = tempfile.mkstemp(dir=directory)
+      os.close(fd)
+      with rman.FileWriter(tmp_path) as writer:
+        self._write_world(writer, world)
+      digest = writer.hexdigest()
+      path = os.path.join(directory, 'static-{}.{}'.format(
+          digest[:16], self.scene_file_ext))
+      os.replace(tmp_path, path)
+      logging.info('Wrote static world %s', path)
+      files[directory] = (path, digest, writer.references)
+    return files[directory]
+
+  def includes(self, scene_file):
+    # Files that have to be next to scene_file to render it.
+    return self._includes.get(scene_file, [])
+
+  def write_scene_file(self, scene, scene_file, output_file=None):
+    with rman.FileWriter(scene_file) as writer:
+      self._write_scene(writer, scene, output_file)
+    self._includes[scene_file] = writer.references
+    return writer.hexdigest()
+
+  def _write_scene(self, writer, scene, output_file):
+    self._write_header(writer, scene, output_file)
+    writer.begin_block('World')
+    if scene.static is not None:
+      path, digest, references = self._static_file(
+          scene.static, writer.directory)
+      # Relative to the scene file, or to the working directory of a piped
+      # render, so that the two can be copied together.
+      writer.write_reference(_include(os.path.basename(path)), path, digest)
+      writer.references.extend(references)
+    self._write_world(writer, scene)
+    writer.end_block('World')
@@ -1,75 +1,173 @@
+import hashlib
+import io
 import logging
+import numpy as np
+import os
+
+
+_VECTOR_TYPES = ('point', 'vector', 'normal', 'color', 'rgb')
+
+
+def format_floats(values):
+  values = np.asarray(values, dtype='float64').ravel()
+  return ' '.join(['%f'] * len(values)) % tuple(values.tolist())
+
+
+def format_integers(values):
+  values = np.asarray(values, dtype='int64').ravel()
+  return ' '.join(map(str, values.tolist()))
+
+
+def format_rows(template, rows):
+  # Formats template, which has one %f per column, for every row of rows.
+  rows = np.asarray(rows, dtype='float64')
+  return (template * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def _vector_formatter(template):
+  def format_vector(v):
+    if isinstance(v, np.ndarray):
+      v = v.tolist()
+    return template % tuple(v)
+  return format_vector
+
+
+def _bool_formatter(true, false):
+  return lambda v: true if v else false
+
+
+def _array_formatter(format_values):
+  return lambda v: ' [' + format_values(v) + ']'
+
+
+def _compile(t, named):
+  # Returns a function formatting a single parameter of type t, either as a
+  # positional argument or as the value of a named parameter.
+  if t.endswith(']'):
+    assert named, 'Arrays are only supported as named parameters'
+    base = t[:t.index('[')]
+    if base == 'integer':
+      return _array_formatter(format_integers)
+    assert base == 'float' or base in _VECTOR_TYPES, 'Unexpected type name'
+    return _array_formatter(format_floats)
+  if t == 'integer':
+    return (' [{:d}]' if named else '  {:d}').format
+  if t == 'float':
+    return (' [{:f}]' if named else '  {:f}').format
+  if t in _VECTOR_TYPES:
+    return _vector_formatter(' [%f %f %f]' if named else '  %f %f %f')
+  if t == 'bool':
+    if named:
+      return _bool_formatter(' ["true"]', ' ["false"]')
+    return _bool_formatter('  "true"', '  "false"')
+  if t == 'string':
+    return (' "{}"' if named else '  "{}"').format
+  assert False, 'Unexpected type name'
 
 
 class Identifier(object):
   def __init__(self, name, positional=None, named=None):
     self._name = name
-    self._positional = positional or []
-    self._named = named or {}
+    self._positional = [_compile(t, False) for t in positional or []]
+    self._named = {
+        n: ('  "{t} {n}"'.format(t=t.split('[')[0], n=n), _compile(t, True))
+        for n, t in (named or {}).items()
+    }
 
-  def __call__(self, *args, **kwargs):
-    s = self._name
-    logging.debug('Creating identifier %s %s %s',
-                  self._name, args, kwargs)
+  def parts(self, *args, **kwargs):
+    if logging.root.isEnabledFor(logging.DEBUG):
+      logging.debug('Creating identifier %s %s %s', self._name, args, kwargs)
     assert len(args) == len(self._positional)
-    for t, arg in zip(self._positional, args):
-      if t == 'integer':
-        s += '  {:d}'.format(arg)
-      elif t == 'float':
-        s += '  {:f}'.format(arg)
-      elif t in ('point', 'vector', 'normal', 'color'):
-        s += '  ' + ' '.join('{:f}'.format(a) for a in arg)
-      elif t == 'bool':
-        s += '  "true"' if arg else '  "false"'
-      elif t == 'string':
-        s += '  "{}"'.format(arg)
-      else:
-        assert False, 'Unexpected type name'
-
+    parts = [self._name]
+    for formatter, arg in zip(self._positional, args):
+      parts.append(formatter(arg))
     for n, v in kwargs.items():
-      t = self._named[n]
-      s += '  "{t} {n}"'.format(t=t, n=n)
-      if t == 'integer':
-        s += ' [{:d}]'.format(v)
-      elif t == 'float':
-        s += ' [{:f}]'.format(v)
-      elif t in ('point', 'vector', 'normal', 'color', 'rgb'):
-        s += ' [' + ' '.join('{:f}'.format(a) for a in v) + ']'
-      elif t == 'bool':
-        s += ' ["true"]' if v else '  ["false"]'
-      elif t == 'string':
-        s += ' "{}"'.format(v)
-      else:
-        assert False, 'Unexpected type name'
-
-    return s
+      if v is None:
+        continue
+      declaration, formatter = self._named[n]
+      parts.append(declaration)
+      parts.append(formatter(v))
+    return parts
+
+  def __call__(self, *args, **kwargs):
+    return ''.join(self.parts(*args, **kwargs))
 
 
 class FileWriter(object):
-  def __init__(self, path):
+  def __init__(self, path, directory=None):
+    # Without a path the text is kept in memory, see getvalue. Files that
+    # the written lines refer to go to directory, by default next to path.
     self.path = path
+    if directory is None and path is not None:
+      directory = os.path.dirname(os.path.abspath(path))
+    self.directory = directory
     self.indent = 0
+    # Digest of everything written except lines marked with digest=False,
+    # e.g. output file names, so equal scenes hash equally wherever they go.
+    self.digest = hashlib.sha256()
+    # Files the written lines refer to.
+    self.references = []
 
   def __enter__(self):
-    self.out = open(self.path, 'w')
+    if self.path is None:
+      self.out = io.StringIO()
+    else:
+      self.out = open(self.path, 'w', buffering=1 << 20)
     return self
 
   def __exit__(self, *args):
-    self.out.close()
+    if self.path is not None:
+      self.out.close()
+
+  def getvalue(self):
+    return self.out.getvalue()
+
+  def _write_line(self, s, digest=True):
+    line = ' ' * self.indent + s + '\n'
+    self.out.write(line)
+    if digest:
+      self.digest.update(line.encode())
 
-  def _write_indent(self):
-    self.out.write(' ' * self.indent)
+  def hexdigest(self):
+    return self.digest.hexdigest()
 
-  def begin_block(self, block):
-    self._write_indent()
-    self.out.write(block + 'Begin\n')
+  def begin_block(self, block, name=None):
+    if name is None:
+      self._write_line(block + 'Begin')
+    else:
+      self._write_line('{}Begin  "{}"'.format(block, name))
     self.indent += 2
 
   def end_block(self, block):
     self.indent -= 2
-    self._write_indent()
-    self.out.write(block + 'End\n')
+    self._write_line(block + 'End')
+
+  def write(self, s, digest=True):
+    self._write_line(s, digest)
+
+  def write_reference(self, s, path, digest):
+    # Writes a line referring to the file at path, hashing the digest of
+    # that file instead of the line, which holds its name.
+    self._write_line(s, digest=False)
+    self.digest.update(digest.encode())
+    self.references.append(path)
+
+  def emit_rows(self, template, rows, chunk_size=10000):
+    # Writes a block of lines, given as a template with %f placeholders, once
+    # per row of rows, formatting up to chunk_size rows at a time.
+    indent = ' ' * self.indent
+    template = ''.join(indent + line for line in template.splitlines(True))
+    for i in range(0, len(rows), chunk_size):
+      s = format_rows(template, rows[i:i + chunk_size])
+      self.out.write(s)
+      self.digest.update(s.encode())
 
-  def write(self, s):
-    self._write_indent()
-    self.out.write(s + '\n')
+  def emit(self, identifier, *args, **kwargs):
+    # Writes the identifier piece by piece, without joining large parameter
+    # lists into one string first.
+    parts = identifier.parts(*args, **kwargs)
+    parts.insert(0, ' ' * self.indent)
+    parts.append('\n')
+    for part in parts:
+      self.out.write(part)
+      self.digest.update(part.encode())
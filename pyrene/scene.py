@@ -1,3 +1,4 @@
+import collections
 import numpy as np
 
 
@@ -31,7 +32,88 @@ class Sphere(Object):
     self.radius = radius
 
 
-class Scene(object):
+class Mesh(Object):
+  # A triangle mesh: points is (N, 3) and indices (M, 3) holds the points of
+  # every triangle.
+  def __init__(self, points, indices, **kwargs):
+    super().__init__(**kwargs)
+    self.points = np.asarray(points, dtype='float64')
+    self.indices = np.asarray(indices, dtype='int64')
+    assert self.points.ndim == 2 and self.points.shape[1] == 3
+    assert self.indices.ndim == 2 and self.indices.shape[1] == 3
+
+
+class Instance(Object):
+  # Places the objects defined under name with Scene.define, scaled, then
+  # rotated by rotate = (angle in degrees, axis) and then translated.
+  # Renderers don't support lights in instances.
+  def __init__(self, name, translate=(0, 0, 0), rotate=None, scale=None):
+    super().__init__()
+    self.name = name
+    self.translate = npvector(translate)
+    self.rotate = None
+    if rotate is not None:
+      self.rotate = (float(rotate[0]), npvector(rotate[1]))
+    self.scale = None
+    if scale is not None:
+      self.scale = np.broadcast_to(npvector(scale), (3,))
+
+
+class SphereSet(object):
+  # Many spheres held as arrays instead of one Sphere each. Simulation arrays
+  # of float64 are used without copying. lights is a list of AreaLights and
+  # light_indices, if given, holds for every sphere the index of its light
+  # in lights, or -1 for none.
+  def __init__(self, centers, radii=1, lights=None, light_indices=None):
+    self.centers = np.asarray(centers, dtype='float64')
+    assert self.centers.ndim == 2 and self.centers.shape[1] == 3
+    self.radii = np.broadcast_to(np.asarray(radii, dtype='float64'),
+                                 (len(self.centers),))
+    self.lights = lights or []
+    if light_indices is not None:
+      light_indices = np.asarray(light_indices, dtype='int64')
+      assert light_indices.shape == (len(self.centers),)
+    self.light_indices = light_indices
+
+  def __len__(self):
+    return len(self.centers)
+
+  def light(self, i):
+    if self.light_indices is None or self.light_indices[i] < 0:
+      return None
+    return self.lights[self.light_indices[i]]
+
+  def sphere(self, i):
+    return Sphere(center=self.centers[i], radius=self.radii[i],
+                  light=self.light(i))
+
+  def plain(self):
+    # Mask of the spheres without a light and away from the origin, which
+    # the scene writers can write in bulk.
+    mask = np.any(self.centers != 0, axis=1)
+    if self.light_indices is not None:
+      mask &= self.light_indices < 0
+    return mask
+
+
+class World(object):
+  def __init__(self, objects=None):
+    self.objects = list(objects or [])
+    # Objects written once and placed by Instances, by name.
+    self.definitions = collections.OrderedDict()
+
+  def define(self, name, objects):
+    assert all(getattr(obj, 'light', None) is None for obj in objects), (
+        'Lights can not be instanced')
+    self.definitions[name] = list(objects)
+
+
+class Scene(World):
   def __init__(self):
+    super().__init__()
     self.camera = Camera()
-    self.objects = []
+    # A World shared by many frames, e.g. the parts of an animation that
+    # don't move. Renderers write it to a file of its own only once and
+    # include that file in every frame, so it must not change once a frame
+    # using it has been written; use a new World instead.
+    self.static = None
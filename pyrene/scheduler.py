@@ -0,0 +1,249 @@
+import collections
+import logging
+import os
+import shlex
+import shutil
+import threading
+import time
+
+from . import process
+
+
+class LocalTransport(object):
+  # Stands in for a remote host: its "remote" file system is a directory on
+  # this machine and commands run locally.
+
+  def __init__(self, root):
+    self.root = root
+    os.makedirs(root, exist_ok=True)
+
+  def remote_path(self, path):
+    return os.path.join(self.root, os.path.basename(path))
+
+  def put(self, path):
+    remote_path = self.remote_path(path)
+    shutil.copyfile(path, remote_path)
+    return remote_path
+
+  def get(self, remote_path, path):
+    shutil.copyfile(remote_path, path)
+
+  def remove(self, remote_paths):
+    for remote_path in remote_paths:
+      if os.path.exists(remote_path):
+        os.remove(remote_path)
+
+  def run(self, args):
+    process.run(args)
+
+
+class SshTransport(object):
+  def __init__(self, host, root='/tmp/pyrene', ssh='ssh', scp='scp'):
+    self.host = host
+    self.root = root
+    self.ssh = ssh
+    self.scp = scp
+    self._root_created = False
+
+  def remote_path(self, path):
+    return '/'.join([self.root, os.path.basename(path)])
+
+  def put(self, path):
+    if not self._root_created:
+      self.run(['mkdir', '-p', self.root])
+      self._root_created = True
+    remote_path = self.remote_path(path)
+    process.run([self.scp, '-q', path, self.host + ':' + remote_path])
+    return remote_path
+
+  def get(self, remote_path, path):
+    process.run([self.scp, '-q', self.host + ':' + remote_path, path])
+
+  def remove(self, remote_paths):
+    self.run(['rm', '-f'] + list(remote_paths))
+
+  def run(self, args):
+    process.run([self.ssh, self.host, ' '.join(shlex.quote(a) for a in args)])
+
+
+class LocalWorker(object):
+  def __init__(self, name='local'):
+    self.name = name
+
+  def render(self, renderer, scene_file, output_file, hdr=False, stats=None):
+    if hdr:
+      return renderer.render_hdr(scene_file, output_file, stats=stats)
+    return renderer.render_scene_file(scene_file, output_file, stats=stats)
+
+
+class RemoteWorker(object):
+  # Renders whole frames on another host. Only the renderer runs remotely:
+  # the scene file is copied there, and the raw output is copied back and
+  # post-processed locally. Renders a single pass, so adaptive sampling is
+  # not supported.
+
+  def __init__(self, transport, name=None, executable=None):
+    self.transport = transport
+    self.name = name or getattr(transport, 'host', 'remote')
+    self.executable = executable
+    # Included files already copied. They are named after their contents and
+    # stay on the host for later frames.
+    self._copied = set()
+
+  def render(self, renderer, scene_file, output_file, hdr=False, stats=None):
+    assert hasattr(renderer, 'render_command'), (
+        'Remote workers need an external renderer')
+    assert renderer.adaptive is None, (
+        'Remote workers do not support adaptive sampling')
+    raw_output = renderer.raw_output_path(output_file)
+    start = time.time()
+    for path in renderer.includes(scene_file):
+      if path not in self._copied:
+        self.transport.put(path)
+        self._copied.add(path)
+    remote_scene = self.transport.put(scene_file)
+    remote_output = self.transport.remote_path(raw_output)
+    args = renderer.render_command(remote_scene, remote_output)
+    if self.executable:
+      args[0] = self.executable
+    try:
+      render_start = time.time()
+      self.transport.run(args)
+      render_time = time.time() - render_start
+      self.transport.get(remote_output, raw_output)
+    finally:
+      self.transport.remove([remote_scene, remote_output])
+    if stats is not None:
+      # Resource usage of the remote process is not available.
+      stats['samples_per_pixel'] = renderer.samples_per_pixel
+      stats['samples_rendered'] = renderer.samples_per_pixel
+      stats['render_time'] = render_time
+      stats['transfer_time'] = time.time() - start - render_time
+    if hdr:
+      return raw_output
+    start = time.time()
+    image = renderer.finish_frame(output_file)
+    if stats is not None:
+      stats['postprocess_time'] = time.time() - start
+    return image
+
+
+class WorkerStats(object):
+  def __init__(self):
+    self.frames = 0
+    self.failures = 0
+    self.consecutive_failures = 0
+    self.busy_time = 0.0
+    self.retired = False
+
+  @property
+  def throughput(self):
+    if self.busy_time == 0:
+      return None
+    return self.frames / self.busy_time
+
+
+class Scheduler(object):
+  # Assigns whole frames to workers. Every worker has its own thread which
+  # pulls the next job as soon as it is free, so faster workers take more
+  # frames. A failed job is retried, on whichever worker gets to it first,
+  # up to max_retries times, and a worker that fails max_worker_failures
+  # jobs in a row is retired.
+
+  def __init__(self, workers, render, lookahead, max_retries=2,
+               max_worker_failures=3):
+    assert workers
+    self.workers = workers
+    self.render = render
+    self.lookahead = lookahead
+    self.max_retries = max_retries
+    self.max_worker_failures = max_worker_failures
+    self.stats = collections.OrderedDict((w, WorkerStats()) for w in workers)
+    self._jobs = collections.deque()
+    self._retries = collections.deque()
+    self._in_progress = 0
+    self._closed = False
+    self._error = None
+    self._cond = threading.Condition()
+    self._threads = [threading.Thread(target=self._run, args=(w,))
+                     for w in workers]
+    for thread in self._threads:
+      thread.start()
+
+  def submit(self, job):
+    with self._cond:
+      while (len(self._jobs) >= self.lookahead and self._error is None):
+        self._cond.wait()
+      if self._error is not None:
+        raise self._error
+      self._jobs.append((job, 0))
+      self._cond.notify_all()
+
+  def join(self):
+    with self._cond:
+      self._closed = True
+      self._cond.notify_all()
+    for thread in self._threads:
+      thread.join()
+    for worker, stats in self.stats.items():
+      logging.info('Worker %s: %d frames, %d failures, %.3f frames/s',
+                   worker.name, stats.frames, stats.failures,
+                   stats.throughput or 0)
+    if self._error is not None:
+      raise self._error
+
+  def _next_job(self):
+    with self._cond:
+      while True:
+        if self._error is not None:
+          return None
+        if self._retries:
+          item = self._retries.popleft()
+        elif self._jobs:
+          item = self._jobs.popleft()
+        elif self._closed and self._in_progress == 0:
+          return None
+        else:
+          self._cond.wait()
+          continue
+        self._in_progress += 1
+        self._cond.notify_all()
+        return item
+
+  def _run(self, worker):
+    stats = self.stats[worker]
+    while True:
+      item = self._next_job()
+      if item is None:
+        return
+      job, attempts = item
+      start = time.time()
+      try:
+        self.render(worker, job)
+      except Exception as e:
+        logging.exception('Worker %s failed to render %s', worker.name, job)
+        self._failed(worker, stats, job, attempts, e)
+      else:
+        with self._cond:
+          stats.busy_time += time.time() - start
+          stats.frames += 1
+          stats.consecutive_failures = 0
+          self._in_progress -= 1
+          self._cond.notify_all()
+      if stats.retired:
+        return
+
+  def _failed(self, worker, stats, job, attempts, error):
+    with self._cond:
+      self._in_progress -= 1
+      stats.failures += 1
+      stats.consecutive_failures += 1
+      if stats.consecutive_failures >= self.max_worker_failures:
+        logging.error('Retiring worker %s', worker.name)
+        stats.retired = True
+      if attempts < self.max_retries and not all(
+          s.retired for s in self.stats.values()):
+        self._retries.append((job, attempts + 1))
+      else:
+        self._error = error
+      self._cond.notify_all()
@@ -0,0 +1,83 @@
+import logging
+import numpy as np
+import os
+import queue
+import threading
+import time
+
+try:
+  import imageio.v2 as imageio
+except ImportError:
+  import imageio
+
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+
+class FrameStream(object):
+  # Feeds completed frames to the video encoder in order. Frames can be added
+  # from any thread and in any order; a background thread holds them back
+  # until all earlier frames are there and encodes them as soon as they are.
+
+  def __init__(self, output, fps, keep_frames=True, codec='libx264'):
+    self.output = output
+    self.fps = fps
+    self.keep_frames = keep_frames
+    self.codec = codec
+    self.next_index = 0
+    self._writer = None
+    self._pending = {}
+    self._queue = queue.Queue()
+    self._error = None
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def add(self, index, frame_path=None, image=None, stats=None):
+    # stats, if given, is the frame's dict, which gets its encode_time.
+    assert frame_path is not None or image is not None
+    self._queue.put((index, frame_path, image, stats))
+
+  def close(self):
+    self._queue.put(None)
+    self._thread.join()
+    if self._error is not None:
+      raise self._error
+    if self._pending:
+      raise Exception('Frames {} were never encoded, frame {} is missing'
+                      .format(sorted(self._pending), self.next_index))
+    if self._writer is not None:
+      self._writer.close()
+    logging.info('Encoded %d frames into %s', self.next_index, self.output)
+
+  def _run(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      if self._error is not None:
+        continue
+      index, frame_path, image, stats = item
+      self._pending[index] = (frame_path, image, stats)
+      try:
+        while self.next_index in self._pending:
+          self._encode(*self._pending.pop(self.next_index))
+          self.next_index += 1
+      except Exception as e:
+        logging.exception('Failed to encode frame %d', self.next_index)
+        self._error = e
+
+  def _encode(self, frame_path, image, stats):
+    start = time.time()
+    if image is None:
+      image = imageio.imread(frame_path)
+    if image.ndim == 2:
+      image = np.dstack([image] * 3)
+    image = image[:, :, :3]
+    if self._writer is None:
+      height, width = image.shape[:2]
+      self._writer = FFMPEG_VideoWriter(
+          self.output, (width, height), self.fps, codec=self.codec)
+    self._writer.write_frame(image)
+    if frame_path is not None and not self.keep_frames:
+      os.remove(frame_path)
+    if stats is not None:
+      stats['encode_time'] = time.time() - start
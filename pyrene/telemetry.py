@@ -0,0 +1,74 @@
+import csv
+import json
+import os
+
+
+# Per-frame fields in the order they are exported. Renderers and workers may
+# add more, which come after these.
+FIELDS = [
+    'frame', 'worker', 'cached', 'resumed', 'generate_time', 'scene_size',
+    'render_time', 'render_cpu_time', 'render_max_rss', 'transfer_time',
+    'postprocess_time', 'encode_time', 'samples_per_pixel', 'samples_rendered',
+    'passes', 'error',
+]
+
+# Fields in the summary, with the unit they are shown in and whether their
+# total means anything.
+_SUMMARY = [
+    ('generate_time', 's', 1, True),
+    ('scene_size', 'MB', 2**20, True),
+    ('render_time', 's', 1, True),
+    ('render_cpu_time', 's', 1, True),
+    ('render_max_rss', 'MB', 2**20, False),
+    ('transfer_time', 's', 1, True),
+    ('postprocess_time', 's', 1, True),
+    ('encode_time', 's', 1, True),
+    ('samples_per_pixel', 'spp', 1, False),
+    ('samples_rendered', 'spp', 1, True),
+]
+
+
+def rows(stats):
+  # stats is a list with a dict per frame, like Movie.stats.
+  return [dict(frame_stats, frame=i) for i, frame_stats in enumerate(stats)]
+
+
+def write_csv(path, stats):
+  table = rows(stats)
+  extra = sorted({k for row in table for k in row} - set(FIELDS))
+  with open(path, 'w', newline='') as f:
+    writer = csv.DictWriter(f, FIELDS + extra)
+    writer.writeheader()
+    writer.writerows(table)
+
+
+def write_json(path, stats):
+  with open(path, 'w') as f:
+    json.dump(rows(stats), f, indent=1)
+
+
+def write(path, stats):
+  # Writes CSV or JSON, depending on the extension of path.
+  ext = os.path.splitext(path)[1]
+  if ext == '.csv':
+    write_csv(path, stats)
+  elif ext == '.json':
+    write_json(path, stats)
+  else:
+    raise ValueError('Unsupported stats file format: {}'.format(path))
+
+
+def summary(stats):
+  lines = ['{} frames, {} cached, {} resumed'.format(
+      len(stats), sum(1 for s in stats if s.get('cached')),
+      sum(1 for s in stats if s.get('resumed')))]
+  for field, unit, scale, total in _SUMMARY:
+    values = [s[field] / scale for s in stats if s.get(field) is not None]
+    if not values:
+      continue
+    line = '{}: mean {:.3f} {unit}, max {:.3f} {unit}'.format(
+        field, sum(values) / len(values), max(values), unit=unit)
+    if total:
+      line += ', total {:.3f} {}'.format(sum(values), unit)
+    lines.append(line)
+  return '\n'.join(lines)
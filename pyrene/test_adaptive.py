@@ -0,0 +1,61 @@
+import numpy as np
+import os
+import tempfile
+import time
+import unittest
+
+from pyrene.adaptive import AdaptiveSampling, relative_error
+
+
+class TestAdaptiveSampling(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.passes = []
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def render_pass(self, samples, delay=0.0):
+    time.sleep(delay)
+    self.passes.append(samples)
+    rng = np.random.RandomState(samples)
+    image = 1 + rng.normal(scale=1 / np.sqrt(samples), size=(32, 32))
+    path = os.path.join(self.dir.name, '{}.npy'.format(samples))
+    np.save(path, image)
+    return path
+
+  def test_relative_error(self):
+    image = np.ones((4, 4))
+    self.assertEqual(relative_error(image, image), 0)
+    self.assertAlmostEqual(relative_error(image, image * 1.1), 0.1)
+
+  def test_target_error(self):
+    stats = {}
+    adaptive = AdaptiveSampling(target_error=0.05, min_samples=4)
+    path = adaptive.render(self.render_pass, np.load, stats)
+    self.assertEqual(self.passes[:2], [4, 8])
+    self.assertEqual(stats['samples_per_pixel'], self.passes[-1])
+    self.assertEqual(stats['samples_rendered'], sum(self.passes))
+    self.assertEqual(stats['passes'], len(self.passes))
+    self.assertLessEqual(stats['error'], 0.05)
+    self.assertEqual(os.listdir(self.dir.name), [os.path.basename(path)])
+
+  def test_max_samples(self):
+    stats = {}
+    adaptive = AdaptiveSampling(target_error=0.001, min_samples=4,
+                                max_samples=32)
+    adaptive.render(self.render_pass, np.load, stats)
+    self.assertEqual(stats['samples_per_pixel'], 32)
+    self.assertGreater(stats['error'], 0.001)
+
+  def test_time_budget(self):
+    adaptive = AdaptiveSampling(target_error=0.001, time_budget=0.4)
+    # Passes take 0.04, 0.08 and 0.16 seconds, and a pass of 0.32 seconds
+    # would not fit into the budget. The margins leave room for slow sleeps.
+    adaptive.render(lambda s: self.render_pass(s, delay=s / 100), np.load)
+    self.assertEqual(self.passes, [4, 8, 16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from pyrene.cache import FrameCache, frame_key
+
+
+class TestFrameCache(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.cache_dir = os.path.join(self.dir.name, 'cache')
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def _file(self, name, size):
+    path = os.path.join(self.dir.name, name)
+    with open(path, 'wb') as f:
+      f.write(b'x' * size)
+    return path
+
+  def test_frame_key(self):
+    self.assertEqual(frame_key('abc', {'width': 10, 'height': 5}),
+                     frame_key('abc', {'height': 5, 'width': 10}))
+    self.assertNotEqual(frame_key('abc', {'width': 10}),
+                        frame_key('abc', {'width': 20}))
+    self.assertNotEqual(frame_key('abc', {}), frame_key('abd', {}))
+
+  def test_get_put(self):
+    cache = FrameCache(self.cache_dir)
+    out = os.path.join(self.dir.name, 'out.png')
+    self.assertFalse(cache.get('k1', out))
+    cache.put('k1', self._file('a.png', 10))
+    self.assertTrue(cache.get('k1', out))
+    self.assertEqual(os.path.getsize(out), 10)
+
+    # A new instance sees the entries on disk.
+    self.assertTrue(FrameCache(self.cache_dir).get('k1', out))
+
+  def test_lru_eviction(self):
+    cache = FrameCache(self.cache_dir, max_size=25)
+    out = os.path.join(self.dir.name, 'out.png')
+    cache.put('k1', self._file('a.png', 10))
+    cache.put('k2', self._file('b.png', 10))
+    self.assertTrue(cache.get('k1', out))
+    cache.put('k3', self._file('c.png', 10))
+    self.assertEqual(cache.size, 20)
+    self.assertTrue(cache.get('k1', out))
+    self.assertFalse(cache.get('k2', out))
+    self.assertTrue(cache.get('k3', out))
+
+
+if __name__ == '__main__':
+    unittest.main()
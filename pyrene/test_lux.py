@@ -1,11 +1,74 @@
+import io
+import os
+import stat
+import sys
+import tempfile
 import unittest
 
-from lux import LuxRenderer
-from scene import Sphere, Scene, AreaLight, Camera
+from pyrene import rman
+from pyrene import tonemap
+
+from pyrene.lux import LuxRenderer
+from pyrene.scene import Sphere, Scene, AreaLight, Camera, World
+
+
+# Stands in for luxconsole: writes a gray PNG of the size of the film for the
+# scene file, '-' for stdin, or for each scene file listed after -L.
+FAKE_LUXCONSOLE = '''#!{python}
+import numpy as np
+import os
+import re
+import sys
+try:
+  import imageio.v2 as imageio
+except ImportError:
+  import imageio
+def read(path):
+  text = open(path).read()
+  for include in re.findall(r'Include  "([^"]+)"', text):
+    text += read(os.path.join(os.path.dirname(path), include))
+  return text
+def render(text, output):
+  width = int(re.search(r'xresolution" \\[(\\d+)\\]', text).group(1))
+  height = int(re.search(r'yresolution" \\[(\\d+)\\]', text).group(1))
+  if output is None:
+    output = re.search(r'filename" "([^"]+)"', text).group(1)
+  imageio.imwrite(output + '.png', np.full((height, width, 3), 128, np.uint8))
+output = sys.argv[sys.argv.index('-o') + 1] if '-o' in sys.argv else None
+if sys.argv[1] == '-L':
+  for path in open(sys.argv[2]).read().split():
+    render(read(path), None)
+elif sys.argv[1] == '-':
+  text = sys.stdin.read()
+  for include in re.findall(r'Include  "([^"]+)"', text):
+    text += read(include)
+  render(text, output)
+else:
+  render(read(sys.argv[1]), output)
+'''
+
+
+def _scene():
+  scene = Scene()
+  scene.camera = Camera(loc=(0, -10, 0), to=(0, 0, 0))
+  scene.objects.append(Sphere())
+  scene.objects.append(Sphere(center=(1, -1, 0.5), radius=0.5,
+                              light=AreaLight(color=(1, 1, 1))))
+  return scene
 
 
 class TestLuxRenderer(unittest.TestCase):
 
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.luxconsole = os.path.join(self.dir.name, 'luxconsole')
+    with open(self.luxconsole, 'w') as f:
+      f.write(FAKE_LUXCONSOLE.format(python=sys.executable))
+    os.chmod(self.luxconsole, stat.S_IRWXU)
+
+  def tearDown(self):
+    self.dir.cleanup()
+
   def test_render(self):
     renderer = LuxRenderer(samples_per_pixel=1000)
     scene = Scene()
@@ -15,6 +78,63 @@ class TestLuxRenderer(unittest.TestCase):
                                 light=AreaLight(color=(1, 1, 1))))
     renderer.render(scene, generate_only=True)
 
+  def test_sphere_runs(self):
+    renderer = LuxRenderer()
+    objects = [Sphere(center=(i, 1, 2), radius=0.1 * i) for i in range(5)]
+    objects.insert(2, Sphere())
+    objects.insert(4, Sphere(center=(1, 1, 1), light=AreaLight()))
+    bulk = rman.FileWriter(None)
+    bulk.out = io.StringIO()
+    renderer._write_objects(bulk, objects)
+    single = rman.FileWriter(None)
+    single.out = io.StringIO()
+    for obj in objects:
+      renderer._write_object(single, obj)
+    self.assertEqual(bulk.out.getvalue(), single.out.getvalue())
+    self.assertEqual(bulk.hexdigest(), single.hexdigest())
+
+  def test_render_scene_file(self):
+    output_file = os.path.join(self.dir.name, 'a.png')
+    scene_file = os.path.join(self.dir.name, 'a.lxs')
+    renderer = LuxRenderer(luxconsole=self.luxconsole, width=16, height=8)
+    renderer.write_scene_file(_scene(), scene_file, output_file)
+    renderer.render_scene_file(scene_file, output_file)
+    self.assertEqual(tonemap.imageio.imread(output_file).shape, (8, 16, 3))
+
+  def test_batch_render(self):
+    renderer = LuxRenderer(luxconsole=self.luxconsole, width=16, height=8)
+    scene_files = []
+    output_files = []
+    for i in range(3):
+      output_files.append(os.path.join(self.dir.name, '{}.png'.format(i)))
+      scene_files.append(os.path.join(self.dir.name, '{}.lxs'.format(i)))
+      renderer.write_scene_file(_scene(), scene_files[-1], output_files[-1])
+    stats = [{} for _ in scene_files]
+    renderer.batch_render(scene_files, workers=2, stats=stats)
+    for output_file in output_files:
+      self.assertEqual(tonemap.imageio.imread(output_file).shape, (8, 16, 3))
+    for frame_stats in stats:
+      self.assertGreater(frame_stats['render_time'], 0)
+      self.assertGreater(frame_stats['render_cpu_time'], 0)
+      self.assertGreater(frame_stats['render_max_rss'], 0)
+    # Frames 0 and 2 were rendered by the same process.
+    self.assertEqual(stats[0]['render_time'], stats[2]['render_time'])
+
+  def test_render_piped(self):
+    output_file = os.path.join(self.dir.name, 'a.png')
+    renderer = LuxRenderer(luxconsole=self.luxconsole, width=16, height=8,
+                           pipe=True)
+    scene = _scene()
+    scene.static = World([Sphere(center=(0, 0, 2))])
+    self.assertEqual(renderer.render_command('-', output_file)[:2],
+                     [self.luxconsole, '-'])
+    renderer.render(scene, output_file=output_file)
+    self.assertEqual(tonemap.imageio.imread(output_file).shape, (8, 16, 3))
+    files = sorted(os.listdir(self.dir.name))
+    self.assertEqual(files[:2], ['a.png', 'luxconsole'])
+    self.assertEqual(len(files), 3)
+    self.assertTrue(files[2].startswith('static-'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,260 @@
+import imageio_ffmpeg
+import numpy as np
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from pyrene.cache import FrameCache, frame_key
+from pyrene.movie import Movie, Preview
+from pyrene.pbrt import PbrtRenderer
+from pyrene import tonemap
+from pyrene.scheduler import LocalTransport, LocalWorker, RemoteWorker
+from pyrene.stream import imageio
+from pyrene.scene import Scene
+
+
+class FakeRenderer(object):
+  def __init__(self, fail_on=None, cache=None):
+    self.scene_file_ext = 'txt'
+    self.cache = cache
+    self.fail_on = fail_on
+    self.lock = threading.Lock()
+    self.running = 0
+    self.max_running = 0
+    self.written = 0
+    self.rendered = 0
+    self.max_ahead = 0
+
+  def write_scene_file(self, scene, scene_file, output_file=None):
+    with open(scene_file, 'w') as f:
+      f.write(str(scene.t))
+    with self.lock:
+      self.written += 1
+      self.max_ahead = max(self.max_ahead, self.written - self.rendered)
+    return str(scene.t)
+
+  def frame_key(self, scene_digest):
+    return frame_key(scene_digest, {})
+
+  def preview(self, scale, samples):
+    self.previewed = (scale, samples)
+    return self
+
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    with self.lock:
+      self.running += 1
+      self.max_running = max(self.max_running, self.running)
+    with open(scene_file) as f:
+      t = f.read()
+    time.sleep(0.01)
+    with self.lock:
+      self.running -= 1
+      self.rendered += 1
+    if t == self.fail_on:
+      raise RuntimeError('render failed')
+    with open(output_file, 'w') as f:
+      f.write(t)
+
+
+class FakeImageRenderer(FakeRenderer):
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    with open(scene_file) as f:
+      t = float(f.read())
+    # Later frames finish first.
+    time.sleep(0.02 * (1 - t))
+    image = np.zeros((32, 48, 3), dtype=np.uint8)
+    image[:, :, 0] = int(t * 200)
+    imageio.imwrite(output_file, image)
+
+
+class FakeHdrRenderer(FakeRenderer):
+  tonemaps_clips = True
+
+  def frame_key(self, scene_digest, hdr=False):
+    return frame_key(scene_digest, {'hdr': hdr})
+
+  def hdr_path(self, output_file):
+    return output_file[:-4] + '.exr'
+
+  def render_hdr(self, scene_file, output_file=None, stats=None):
+    with open(scene_file) as f:
+      t = float(f.read())
+    image = np.ones((8, 8, 3), dtype=np.float32)
+    image[:4] = 2
+    # Every other frame has a firefly which per-frame normalization follows.
+    if round(t * 10) % 2:
+      image[0, 0] = 10
+    tonemap.write_exr(self.hdr_path(output_file), image)
+
+  def finish_frame(self, output_file=None, white=None):
+    return tonemap.postprocess(self.hdr_path(output_file), output_file,
+                               white=white)
+
+  def render_scene_file(self, scene_file, output_file=None, stats=None):
+    self.render_hdr(scene_file, output_file)
+    return self.finish_frame(output_file)
+
+
+class FakeBatchRenderer(FakeRenderer):
+  def __init__(self, **kwargs):
+    super().__init__(**kwargs)
+    self.batches = []
+
+  def batch_render(self, scene_files, output_files=None, workers=1,
+                   stats=None):
+    self.batches.append((self.written, len(scene_files), workers))
+    return [self.render_scene_file(s, o)
+            for s, o in zip(scene_files, output_files)]
+
+
+def frame_func(t):
+  scene = Scene()
+  scene.t = t
+  return scene
+
+
+class TestMovie(unittest.TestCase):
+
+  def test_render_clip_parallel(self):
+    renderer = FakeRenderer()
+    movie = Movie(renderer, fps=10, workers=4)
+    movie.render_clip(0.0, 2.0, frame_func)
+    self.assertEqual(len(movie.frames), 20)
+    self.assertLessEqual(renderer.max_running, 4)
+    for i, frame in enumerate(movie.frames):
+      with open(frame) as f:
+        self.assertAlmostEqual(float(f.read()), i / 10)
+
+  def test_render_clip_sequential(self):
+    movie = Movie(FakeRenderer(), fps=10)
+    movie.render_clip(0.0, 0.5, frame_func)
+    movie.render_clip(0.5, 1.0, frame_func)
+    self.assertEqual(len(movie.frames), 10)
+    self.assertTrue(all(os.path.exists(f) for f in movie.frames))
+
+  def test_scene_generation_runs_ahead(self):
+    renderer = FakeRenderer()
+    movie = Movie(renderer, fps=10, workers=1, lookahead=3)
+    movie.render_clip(0.0, 1.0, frame_func)
+    self.assertGreater(renderer.max_ahead, 1)
+    self.assertLessEqual(renderer.max_ahead, 5)
+
+  def test_cache(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      renderer = FakeRenderer(cache=FrameCache(cache_dir))
+      Movie(renderer, fps=10, workers=2).render_clip(0.0, 1.0, frame_func)
+      self.assertEqual(renderer.rendered, 10)
+
+      renderer = FakeRenderer(cache=FrameCache(cache_dir))
+      movie = Movie(renderer, fps=10, workers=2)
+      movie.render_clip(0.0, 1.5, frame_func)
+      self.assertEqual(renderer.rendered, 5)
+      for i, frame in enumerate(movie.frames):
+        with open(frame) as f:
+          self.assertAlmostEqual(float(f.read()), i / 10)
+
+  def test_resume(self):
+    with tempfile.TemporaryDirectory() as work_dir:
+      renderer = FakeRenderer(fail_on='1.2')
+      movie = Movie(renderer, fps=10, work_dir=work_dir)
+      with self.assertRaises(RuntimeError):
+        movie.render_clip(0.0, 2.0, frame_func)
+      del movie
+
+      # Corrupt one of the completed frames.
+      with open(os.path.join(work_dir, 'f00003.png'), 'w') as f:
+        f.write('garbage')
+
+      renderer = FakeRenderer()
+      movie = Movie(renderer, fps=10, work_dir=work_dir)
+      movie.render_clip(0.0, 2.0, frame_func)
+      self.assertEqual(renderer.rendered, 20 - 12 + 1)
+      for i, frame in enumerate(movie.frames):
+        with open(frame) as f:
+          self.assertAlmostEqual(float(f.read()), i / 10)
+
+  def test_stream(self):
+    with tempfile.TemporaryDirectory() as out_dir:
+      output = os.path.join(out_dir, 'out.mp4')
+      movie = Movie(FakeImageRenderer(), fps=10, workers=4, output=output,
+                    keep_frames=False)
+      movie.render_clip(0.0, 1.0, frame_func)
+      movie.write()
+      nframes, _ = imageio_ffmpeg.count_frames_and_secs(output)
+      self.assertEqual(nframes, 10)
+      self.assertFalse(any(os.path.exists(f) for f in movie.frames))
+      for stats in movie.stats:
+        self.assertIn(stats['worker'], ['local0', 'local1', 'local2', 'local3'])
+        self.assertGreater(stats['scene_size'], 0)
+        self.assertIn('generate_time', stats)
+        self.assertIn('encode_time', stats)
+
+  def test_preview(self):
+    with tempfile.TemporaryDirectory() as out_dir:
+      output = os.path.join(out_dir, 'out.mp4')
+      renderer = FakeImageRenderer()
+      movie = Movie(renderer, fps=20, workers=2, output=output,
+                    preview=Preview(scale=0.5, samples=0.2, step=4))
+      movie.render_clip(0.0, 1.0, frame_func)
+      movie.write()
+      self.assertEqual(renderer.previewed, (0.5, 0.2))
+      self.assertEqual(len(movie.frames), 5)
+      nframes, secs = imageio_ffmpeg.count_frames_and_secs(output)
+      self.assertEqual(nframes, 5)
+      self.assertAlmostEqual(secs, 1.0, delta=0.1)
+
+  def test_batch_needs_local_workers(self):
+    with tempfile.TemporaryDirectory() as root:
+      workers = [LocalWorker(), RemoteWorker(LocalTransport(root))]
+      with self.assertRaises(AssertionError):
+        Movie(FakeBatchRenderer(), workers=workers, batch=True)
+
+  def test_clip_exposure(self):
+    def brightness(movie):
+      return [imageio.imread(f)[4:, :, 0].mean() for f in movie.frames]
+
+    movie = Movie(FakeHdrRenderer(), fps=10, workers=2)
+    movie.render_clip(0.0, 2.0, frame_func)
+    flicker = np.std(brightness(movie))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+      renderer = FakeHdrRenderer(cache=FrameCache(cache_dir))
+      movie = Movie(renderer, fps=10, workers=2, exposure='clip')
+      movie.render_clip(0.0, 2.0, frame_func)
+      self.assertLess(np.std(brightness(movie)), flicker / 4)
+
+      # The cache holds the HDR frames and the clip is tonemapped again.
+      renderer = FakeHdrRenderer(cache=FrameCache(cache_dir))
+      movie = Movie(renderer, fps=10, workers=2, exposure='clip')
+      movie.render_clip(0.0, 2.0, frame_func)
+      self.assertTrue(all(os.path.exists(f) for f in movie.frames))
+
+  def test_clip_exposure_needs_white_point(self):
+    with self.assertRaises(AssertionError):
+      Movie(FakeRenderer(), exposure='clip')
+    with self.assertRaises(AssertionError):
+      Movie(PbrtRenderer(postprocess='exrtools'), exposure='clip')
+    Movie(PbrtRenderer(), exposure='clip')
+
+  def test_batch(self):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      renderer = FakeBatchRenderer(cache=FrameCache(cache_dir))
+      movie = Movie(renderer, fps=10, workers=3, batch=True)
+      movie.render_clip(0.0, 1.0, frame_func)
+      movie.render_clip(0.0, 1.5, frame_func)
+      self.assertEqual(renderer.batches, [(10, 10, 3), (25, 5, 3)])
+      times = [i / 10 for i in range(10)] + [i / 10 for i in range(15)]
+      for t, frame in zip(times, movie.frames):
+        with open(frame) as f:
+          self.assertAlmostEqual(float(f.read()), t)
+
+  def test_render_error(self):
+    movie = Movie(FakeRenderer(fail_on='0.3'), fps=10, workers=2)
+    with self.assertRaises(RuntimeError):
+      movie.render_clip(0.0, 2.0, frame_func)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import io
+import numpy as np
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from pyrene import ply
+from pyrene import rman
+from pyrene import tonemap
+from pyrene.adaptive import AdaptiveSampling
+from pyrene.pbrt import PbrtRenderer
+from pyrene.scene import (
+    Sphere, SphereSet, Mesh, Instance, World, Scene, AreaLight, Camera)
+
+
+# Stands in for pbrt: writes a gradient EXR with noise that falls with the
+# number of samples per pixel.
+FAKE_PBRT = '''#!{python}
+import numpy as np
+import OpenEXR
+import os
+import re
+import sys
+def read(path):
+  text = open(path).read()
+  for include in re.findall(r'Include  "([^"]+)"', text):
+    text += read(os.path.join(os.path.dirname(path), include))
+  return text
+if sys.argv[1] != '-':
+  text = read(sys.argv[1])
+else:
+  text = sys.stdin.read()
+  for include in re.findall(r'Include  "([^"]+)"', text):
+    text += read(include)
+width = int(re.search(r'xresolution" \\[(\\d+)\\]', text).group(1))
+height = int(re.search(r'yresolution" \\[(\\d+)\\]', text).group(1))
+samples = re.search(r'pixelsamples" \\[(\\d+)\\]', text)
+samples = int(samples.group(1)) if samples else 16
+filename = re.search(r'filename" "([^"]+)"', text)
+if '--outfile' in sys.argv:
+  filename = sys.argv[sys.argv.index('--outfile') + 1]
+else:
+  filename = filename.group(1)
+image = np.ones((height, width, 3), dtype=np.float32)
+image *= np.linspace(0, 4, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+image *= 1 + np.random.normal(scale=0.1 / np.sqrt(samples), size=image.shape)
+image = np.maximum(image, 0).astype(np.float32)
+exr = OpenEXR.OutputFile(filename, OpenEXR.Header(width, height))
+exr.writePixels({{c: np.ascontiguousarray(image[:, :, i]).tobytes()
+                 for i, c in enumerate('RGB')}})
+exr.close()
+'''
+
+
+def _scene():
+  scene = Scene()
+  scene.camera = Camera(loc=(0, -10, 0), to=(0, 0, 0))
+  scene.objects.append(Sphere())
+  scene.objects.append(Sphere(center=(1, -1, 0.5), radius=0.5,
+                              light=AreaLight(color=(1, 1, 1))))
+  return scene
+
+
+class TestPbrtRenderer(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+    self.executable = os.path.join(self.dir.name, 'pbrt')
+    with open(self.executable, 'w') as f:
+      f.write(FAKE_PBRT.format(python=sys.executable))
+    os.chmod(self.executable, stat.S_IRWXU)
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_generate(self):
+    scene_file = os.path.join(self.dir.name, 'a.pbrt')
+    renderer = PbrtRenderer(samples_per_pixel=16, scene_file=scene_file)
+    renderer.render(_scene(), generate_only=True)
+    with open(scene_file) as f:
+      text = f.read()
+    self.assertIn('"integer pixelsamples" [16]', text)
+    self.assertIn('Shape  "sphere"  "float radius" [0.500000]', text)
+
+  def test_sphere_runs(self):
+    renderer = PbrtRenderer()
+    objects = [Sphere(center=(i, 1, 2), radius=0.1 * i) for i in range(5)]
+    objects.insert(2, Sphere())
+    objects.insert(4, Sphere(center=(1, 1, 1), light=AreaLight()))
+    bulk = rman.FileWriter(None)
+    bulk.out = io.StringIO()
+    renderer._write_objects(bulk, objects)
+    single = rman.FileWriter(None)
+    single.out = io.StringIO()
+    for obj in objects:
+      renderer._write_object(single, obj)
+    self.assertEqual(bulk.out.getvalue(), single.out.getvalue())
+    self.assertEqual(bulk.hexdigest(), single.hexdigest())
+
+  def test_sphere_set(self):
+    renderer = PbrtRenderer()
+    centers = np.arange(15, dtype='float64').reshape(5, 3)
+    spheres = SphereSet(centers, radii=0.5, lights=[AreaLight()],
+                        light_indices=[-1, -1, 0, -1, -1])
+    self.assertIs(spheres.centers, centers)
+    bulk = rman.FileWriter(None)
+    bulk.out = io.StringIO()
+    renderer._write_objects(bulk, [Sphere(), spheres])
+    single = rman.FileWriter(None)
+    single.out = io.StringIO()
+    for obj in [Sphere()] + [spheres.sphere(i) for i in range(len(spheres))]:
+      renderer._write_object(single, obj)
+    self.assertEqual(bulk.out.getvalue(), single.out.getvalue())
+    self.assertEqual(bulk.out.getvalue().count('AreaLightSource'), 1)
+
+  def test_instances(self):
+    scene_file = os.path.join(self.dir.name, 'a.pbrt')
+    scene = _scene()
+    scene.define('square', [Mesh([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)],
+                                 [(0, 1, 2), (0, 2, 3)])])
+    scene.objects.append(Instance('square', translate=(1, 2, 3)))
+    scene.objects.append(Instance('square', rotate=(90, (0, 0, 1)), scale=2))
+    PbrtRenderer().write_scene_file(scene, scene_file)
+    with open(scene_file) as f:
+      text = f.read()
+    self.assertEqual(text.count('trianglemesh'), 1)
+    self.assertIn(
+        '  ObjectBegin  "square"\n'
+        '    AttributeBegin\n'
+        '      Shape  "trianglemesh"  "integer indices" [0 1 2 0 2 3]', text)
+    self.assertIn(
+        '  AttributeBegin\n'
+        '    Translate  1.000000 2.000000 3.000000\n'
+        '    ObjectInstance  "square"\n', text)
+    self.assertIn(
+        '    Rotate  90.000000  0.000000 0.000000 1.000000\n'
+        '    Scale  2.000000 2.000000 2.000000\n'
+        '    ObjectInstance  "square"\n', text)
+    with self.assertRaises(AssertionError):
+      scene.define('light', [Sphere(light=AreaLight())])
+
+  def test_static_world(self):
+    renderer = PbrtRenderer(
+        executable=self.executable, width=16, height=8,
+        adaptive=AdaptiveSampling(target_error=0.5, min_samples=2))
+    static = World([Sphere(center=(0, 0, i)) for i in range(3)])
+    digests = []
+    for i in range(2):
+      scene = _scene()
+      scene.static = static
+      scene_file = os.path.join(self.dir.name, 'f{}.pbrt'.format(i))
+      digests.append(renderer.write_scene_file(
+          scene, scene_file, os.path.join(self.dir.name, 'f{}.png'.format(i))))
+    static_files = [f for f in os.listdir(self.dir.name)
+                    if f.startswith('static-')]
+    self.assertEqual(len(static_files), 1)
+    self.assertEqual(renderer.includes(scene_file),
+                     [os.path.join(self.dir.name, static_files[0])])
+    with open(scene_file) as f:
+      self.assertIn('Include  "{}"'.format(static_files[0]), f.read())
+    self.assertEqual(digests[0], digests[1])
+    # Rendering resolves the include relative to the scene file.
+    renderer.render_scene_file(scene_file, os.path.join(self.dir.name, 'f1.png'))
+    self.assertTrue(os.path.exists(os.path.join(self.dir.name, 'f1.png')))
+
+    scene.static = World([Sphere(center=(0, 0, 4))])
+    self.assertNotEqual(
+        renderer.write_scene_file(scene, scene_file), digests[0])
+
+  def test_ply_mesh(self):
+    points = np.array([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0.5)])
+    indices = np.array([(0, 1, 2), (0, 2, 3)])
+    scene = _scene()
+    scene.static = World([Mesh(points, indices)])
+    scene_file = os.path.join(self.dir.name, 'a.pbrt')
+    renderer = PbrtRenderer(ply_triangles=2)
+    digest = renderer.write_scene_file(scene, scene_file)
+    static_file, ply_file = renderer.includes(scene_file)
+    with open(static_file) as f:
+      self.assertIn('Shape  "plymesh"  "string filename" "{}"'.format(
+          os.path.basename(ply_file)), f.read())
+    ply_points, ply_indices = ply.read(ply_file)
+    np.testing.assert_array_equal(ply_points, points)
+    np.testing.assert_array_equal(ply_indices, indices)
+
+    scene.static = World([Mesh(points * 2, indices)])
+    self.assertNotEqual(renderer.write_scene_file(scene, scene_file), digest)
+
+  def test_preview(self):
+    renderer = PbrtRenderer(width=1280, height=720,
+                            adaptive=AdaptiveSampling(min_samples=16))
+    preview = renderer.preview(scale=0.25, samples=0.25)
+    self.assertEqual((preview.width, preview.height), (320, 180))
+    self.assertEqual(preview.samples_per_pixel, 4)
+    self.assertIsNone(preview.adaptive)
+    self.assertEqual(renderer.width, 1280)
+    self.assertNotEqual(preview.frame_key('digest'),
+                        renderer.frame_key('digest'))
+
+  def test_render(self):
+    output_file = os.path.join(self.dir.name, 'a.png')
+    renderer = PbrtRenderer(executable=self.executable, width=16, height=8)
+    renderer.render(_scene(), output_file=output_file)
+    image = tonemap.imageio.imread(output_file)
+    self.assertEqual(image.shape, (8, 16, 3))
+    self.assertEqual(image[0, 0, 0], 0)
+    self.assertGreater(image[0, -1, 0], 200)
+
+  def test_render_piped(self):
+    output_file = os.path.join(self.dir.name, 'a.png')
+    renderer = PbrtRenderer(executable=self.executable, width=16, height=8,
+                            pipe=True)
+    scene = _scene()
+    scene.static = World([Sphere(center=(0, 0, 2))])
+    renderer.render(scene, output_file=output_file)
+    image = tonemap.imageio.imread(output_file)
+    self.assertEqual(image.shape, (8, 16, 3))
+    files = sorted(os.listdir(self.dir.name))
+    self.assertEqual(files[:3], ['a.exr', 'a.png', 'pbrt'])
+    self.assertEqual(len(files), 4)
+    self.assertTrue(files[3].startswith('static-'))
+
+  def test_render_adaptive(self):
+    output_file = os.path.join(self.dir.name, 'a.png')
+    renderer = PbrtRenderer(
+        executable=self.executable, width=32, height=16,
+        adaptive=AdaptiveSampling(target_error=0.01, min_samples=2))
+    stats = {}
+    scene_file = os.path.join(self.dir.name, 'a.pbrt')
+    renderer.write_scene_file(_scene(), scene_file, output_file)
+    renderer.render_scene_file(scene_file, output_file, stats=stats)
+    self.assertGreater(stats['samples_per_pixel'], 2)
+    self.assertLessEqual(stats['error'], 0.01)
+    self.assertEqual(sorted(os.listdir(self.dir.name)),
+                     ['a.exr', 'a.pbrt', 'a.png', 'pbrt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import numpy as np
+import os
+import tempfile
+import unittest
+
+import pyrene
+from pyrene.raster import RasterRenderer
+from pyrene.scene import (
+    Sphere, SphereSet, Mesh, Instance, Scene, AreaLight, Camera)
+
+
+def _scene():
+  scene = Scene()
+  scene.camera = Camera(loc=(0, -10, 0), to=(0, 0, 0))
+  scene.objects.append(Sphere())
+  scene.objects.append(Sphere(center=(2, -1, 1.2), radius=0.3,
+                              light=AreaLight(color=(1, 0, 0))))
+  return scene
+
+
+class TestRasterRenderer(unittest.TestCase):
+
+  def render(self, scene, **kwargs):
+    renderer = RasterRenderer(width=48, height=32, **kwargs)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      scene_file = os.path.join(tmp_dir, 'a.npz')
+      digest = renderer.write_scene_file(scene, scene_file)
+      return digest, renderer.render_scene_file(scene_file)
+
+  def test_spheres(self):
+    _, image = self.render(_scene())
+    self.assertEqual(image.shape, (32, 48, 3))
+    self.assertEqual(image[0, 0].tolist(), [0, 0, 0])
+    # The light is up and to the right.
+    self.assertEqual(image[8, 36].tolist(), [255, 0, 0])
+    center = image[16, 24]
+    # Ambient white light and the red light.
+    self.assertGreater(center[0], center[1])
+    self.assertEqual(center[1], center[2])
+    self.assertGreater(image[12, 27, 0], image[20, 21, 0])
+
+  def test_sphere_set(self):
+    scene = _scene()
+    digest, image = self.render(scene)
+    scene.objects = [SphereSet(
+        [(0, 0, 0), (2, -1, 1.2)], [1, 0.3],
+        lights=[AreaLight(color=(1, 0, 0))], light_indices=[-1, 0])]
+    other_digest, other_image = self.render(scene)
+    np.testing.assert_array_equal(image, other_image)
+    self.assertEqual(digest, other_digest)
+
+  def test_instances(self):
+    scene = Scene()
+    scene.camera = Camera(loc=(0, -10, 0), to=(0, 0, 0))
+    scene.define('square', [Mesh([(-1, 0, -1), (1, 0, -1), (1, 0, 1),
+                                  (-1, 0, 1)], [(0, 1, 2), (0, 2, 3)])])
+    scene.objects.append(Instance('square', translate=(1, 0, 0), scale=0.5))
+    _, image = self.render(scene)
+    covered = image[:, :, 0] > 0
+    rows, columns = np.nonzero(covered)
+    self.assertGreater(covered.sum(), 20)
+    self.assertGreaterEqual(columns.min(), 24)
+    self.assertLessEqual(abs(rows.min() + rows.max() - 31), 1)
+
+  def test_create_renderer(self):
+    renderer = pyrene.create_renderer(
+        renderer='raster', config={}, width=64, samples_per_pixel=20)
+    self.assertIsInstance(renderer, RasterRenderer)
+    movie = pyrene.Movie(renderer, fps=4, workers=2)
+    movie.render_clip(0.0, 1.0, lambda t: _scene())
+    self.assertEqual(len(movie.frames), 4)
+    self.assertEqual(movie.stats[0]['samples_per_pixel'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import numpy as np
+import unittest
+
+from pyrene import rman
+
+
+_shape = rman.Identifier(
+    'Shape', positional=['string'],
+    named={
+        'radius': 'float',
+        'indices': 'integer[]',
+        'P': 'point[]',
+        'smooth': 'bool',
+    })
+
+_look_at = rman.Identifier('LookAt', positional=['point', 'point', 'vector'])
+
+
+class TestIdentifier(unittest.TestCase):
+
+  def test_positional(self):
+    self.assertEqual(
+        _look_at((0, -1, 0), np.zeros(3), (0, 0, 1)),
+        'LookAt  0.000000 -1.000000 0.000000  0.000000 0.000000 0.000000'
+        '  0.000000 0.000000 1.000000')
+
+  def test_named(self):
+    self.assertEqual(_shape('sphere', radius=0.5, smooth=False),
+                     'Shape  "sphere"  "float radius" [0.500000]'
+                     '  "bool smooth" ["false"]')
+    self.assertEqual(_shape('sphere', radius=None), 'Shape  "sphere"')
+
+  def test_arrays(self):
+    self.assertEqual(
+        _shape('trianglemesh', indices=np.array([[0, 1, 2], [0, 2, 3]]),
+               P=np.arange(12).reshape(4, 3) / 2),
+        'Shape  "trianglemesh"  "integer indices" [0 1 2 0 2 3]'
+        '  "point P" [0.000000 0.500000 1.000000 1.500000 2.000000 2.500000'
+        ' 3.000000 3.500000 4.000000 4.500000 5.000000 5.500000]')
+
+  def test_unexpected_type(self):
+    with self.assertRaises(AssertionError):
+      rman.Identifier('Foo', positional=['matrix'])
+
+
+class TestFileWriter(unittest.TestCase):
+
+  def test_emit(self):
+    writer = rman.FileWriter(None)
+    writer.out = io.StringIO()
+    writer.begin_block('World')
+    writer.emit(_shape, 'sphere', radius=1)
+    writer.write('Film  "image"', digest=False)
+    writer.end_block('World')
+    self.assertEqual(writer.out.getvalue(),
+                     'WorldBegin\n'
+                     '  Shape  "sphere"  "float radius" [1.000000]\n'
+                     '  Film  "image"\n'
+                     'WorldEnd\n')
+
+    other = rman.FileWriter(None)
+    other.out = io.StringIO()
+    other.begin_block('World')
+    other.write(_shape('sphere', radius=1))
+    other.write('Film  "other"', digest=False)
+    other.end_block('World')
+    self.assertEqual(writer.hexdigest(), other.hexdigest())
+
+  def test_emit_rows(self):
+    writer = rman.FileWriter(None)
+    writer.out = io.StringIO()
+    writer.begin_block('World')
+    writer.emit_rows('Translate  %f\nShape  [%f]\n', [[1, 2], [3, 4], [5, 6]],
+                     chunk_size=2)
+    writer.end_block('World')
+    self.assertEqual(writer.out.getvalue(),
+                     'WorldBegin\n'
+                     '  Translate  1.000000\n  Shape  [2.000000]\n'
+                     '  Translate  3.000000\n  Shape  [4.000000]\n'
+                     '  Translate  5.000000\n  Shape  [6.000000]\n'
+                     'WorldEnd\n')
+
+    other = rman.FileWriter(None)
+    other.out = io.StringIO()
+    other.write(writer.out.getvalue()[:-1])
+    self.assertEqual(writer.hexdigest(), other.hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from pyrene.process import RenderError
+from pyrene.raster import RasterRenderer
+from pyrene.scheduler import LocalTransport, RemoteWorker, Scheduler
+
+
+class FakeWorker(object):
+  def __init__(self, name, delay=0.0, fail=0):
+    self.name = name
+    self.delay = delay
+    self.fail = fail
+    self.jobs = []
+
+
+def render(worker, job):
+  time.sleep(worker.delay)
+  if worker.fail:
+    worker.fail -= 1
+    raise RenderError('failed')
+  worker.jobs.append(job)
+
+
+# Copies the scene file to the output, like a renderer would produce it.
+COPY = 'import shutil, sys; shutil.copyfile(sys.argv[1], sys.argv[2])'
+
+
+class CopyRenderer(object):
+  adaptive = None
+  samples_per_pixel = 16
+
+  def raw_output_path(self, output_file):
+    return output_file + '.raw'
+
+  def includes(self, scene_file):
+    return []
+
+  def render_command(self, scene_file, raw_output=None):
+    return [sys.executable, '-c', COPY, scene_file, raw_output]
+
+  def finish_frame(self, output_file=None, white=None):
+    os.rename(output_file + '.raw', output_file)
+    return 'finished'
+
+
+class TestScheduler(unittest.TestCase):
+
+  def test_load_balancing(self):
+    fast = FakeWorker('fast', delay=0.001)
+    slow = FakeWorker('slow', delay=0.02)
+    scheduler = Scheduler([fast, slow], render, lookahead=4)
+    for i in range(40):
+      scheduler.submit(i)
+    scheduler.join()
+    self.assertEqual(sorted(fast.jobs + slow.jobs), list(range(40)))
+    self.assertGreater(len(fast.jobs), 2 * len(slow.jobs))
+    self.assertGreater(scheduler.stats[fast].throughput,
+                       scheduler.stats[slow].throughput)
+
+  def test_retry(self):
+    good = FakeWorker('good', delay=0.005)
+    broken = FakeWorker('broken', fail=1000)
+    scheduler = Scheduler([good, broken], render, lookahead=2,
+                          max_retries=5)
+    for i in range(20):
+      scheduler.submit(i)
+    scheduler.join()
+    self.assertEqual(sorted(good.jobs), list(range(20)))
+    self.assertTrue(scheduler.stats[broken].retired)
+    self.assertEqual(scheduler.stats[broken].failures, 3)
+
+  def test_failure(self):
+    scheduler = Scheduler([FakeWorker('broken', fail=1000)], render,
+                          lookahead=2)
+    with self.assertRaises(RenderError):
+      for i in range(20):
+        scheduler.submit(i)
+      scheduler.join()
+
+  def test_remote_worker(self):
+    with tempfile.TemporaryDirectory() as local_dir, \
+        tempfile.TemporaryDirectory() as remote_dir:
+      scene_file = os.path.join(local_dir, 'f00000.txt')
+      output_file = os.path.join(local_dir, 'f00000.png')
+      with open(scene_file, 'w') as f:
+        f.write('scene')
+      worker = RemoteWorker(LocalTransport(remote_dir), name='remote')
+      result = worker.render(CopyRenderer(), scene_file, output_file)
+      self.assertEqual(result, 'finished')
+      with open(output_file) as f:
+        self.assertEqual(f.read(), 'scene')
+      self.assertEqual(os.listdir(remote_dir), [])
+
+  def test_remote_worker_in_process_renderer(self):
+    worker = RemoteWorker(LocalTransport(tempfile.gettempdir()))
+    with self.assertRaisesRegex(AssertionError, 'external renderer'):
+      worker.render(RasterRenderer(), 'f00000.npz', 'f00000.png')
+
+
+if __name__ == '__main__':
+    unittest.main()
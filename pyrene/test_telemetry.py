@@ -0,0 +1,80 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from pyrene import process
+from pyrene import telemetry
+
+
+STATS = [
+    {'generate_time': 0.5, 'scene_size': 2**20, 'render_time': 2.0,
+     'render_max_rss': 2**21, 'worker': 'local0', 'samples_per_pixel': 16,
+     'samples_rendered': 28},
+    {'cached': True, 'generate_time': 1.5, 'scene_size': 2**20},
+]
+
+
+class TestTelemetry(unittest.TestCase):
+
+  def test_process_stats(self):
+    stats = {}
+    allocate = 'x = bytearray(64 << 20); sum(range(10**6))'
+    for _ in range(2):
+      process.run([sys.executable, '-c', allocate], stats=stats)
+    self.assertGreater(stats['render_time'], 0)
+    self.assertGreater(stats['render_cpu_time'], 0)
+    self.assertLessEqual(stats['render_cpu_time'], stats['render_time'] * 2)
+    self.assertGreater(stats['render_max_rss'], 64 << 20)
+
+  def test_process_input(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'out')
+      copy = 'import sys; open(sys.argv[1], "w").write(sys.stdin.read())'
+      process.run([sys.executable, '-c', copy, path], input=b'scene')
+      with open(path) as f:
+        self.assertEqual(f.read(), 'scene')
+    with self.assertRaises(process.RenderError):
+      process.run([sys.executable, '-c', 'exit(3)'], input=b'x' * (1 << 20))
+
+  def test_process_status(self):
+    with self.assertRaisesRegex(process.RenderError, 'status 3$'):
+      process.run([sys.executable, '-c', 'exit(3)'])
+    kill = 'import os, signal; os.kill(os.getpid(), signal.SIGKILL)'
+    with self.assertRaisesRegex(process.RenderError, 'status -9$'):
+      process.run([sys.executable, '-c', kill])
+
+  def test_write(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'stats.csv')
+      telemetry.write(path, STATS)
+      with open(path) as f:
+        rows = list(csv.DictReader(f))
+      self.assertEqual([row['frame'] for row in rows], ['0', '1'])
+      self.assertEqual(rows[1]['cached'], 'True')
+
+      path = os.path.join(tmp_dir, 'stats.json')
+      telemetry.write(path, STATS)
+      with open(path) as f:
+        self.assertEqual(json.load(f)[0]['worker'], 'local0')
+
+      with self.assertRaises(ValueError):
+        telemetry.write(os.path.join(tmp_dir, 'stats.txt'), STATS)
+
+  def test_summary(self):
+    self.assertEqual(
+        telemetry.summary(STATS).splitlines(),
+        ['2 frames, 1 cached, 0 resumed',
+         'generate_time: mean 1.000 s, max 1.500 s, total 2.000 s',
+         'scene_size: mean 1.000 MB, max 1.000 MB, total 2.000 MB',
+         'render_time: mean 2.000 s, max 2.000 s, total 2.000 s',
+         'render_max_rss: mean 2.000 MB, max 2.000 MB',
+         'samples_per_pixel: mean 16.000 spp, max 16.000 spp',
+         'samples_rendered: mean 28.000 spp, max 28.000 spp, '
+         'total 28.000 spp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import numpy as np
+import os
+import tempfile
+import unittest
+
+from pyrene import tonemap
+
+
+class TestTonemap(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.dir.cleanup()
+
+  def test_exr_round_trip(self):
+    path = os.path.join(self.dir.name, 'a.exr')
+    image = np.random.random((6, 10, 3)).astype(np.float32) * 100
+    tonemap.write_exr(path, image)
+    np.testing.assert_array_equal(tonemap.read_exr(path), image)
+
+  def test_postprocess(self):
+    exr_file = os.path.join(self.dir.name, 'a.exr')
+    png_file = os.path.join(self.dir.name, 'a.png')
+    image = np.zeros((4, 8, 3), dtype=np.float32)
+    image[:, :, :] = np.arange(8)[np.newaxis, :, np.newaxis]
+    tonemap.write_exr(exr_file, image)
+    result = tonemap.postprocess(exr_file, png_file)
+    self.assertEqual(result.dtype, np.uint8)
+    self.assertEqual(result.shape, (4, 8, 3))
+    self.assertEqual(result.max(), 255)
+    self.assertEqual(result.min(), 0)
+    self.assertTrue(np.all(np.diff(result[0, :, 0].astype(int)) > 0))
+    np.testing.assert_array_equal(tonemap.imageio.imread(png_file), result)
+
+  def test_clip_exposure(self):
+    exposure = tonemap.ClipExposure(window=5)
+    for i in range(20):
+      image = np.full((64, 64, 3), 1.0, dtype=np.float32)
+      # A firefly in every other frame.
+      if i % 2:
+        image[0, 0, :] = 1000
+      exposure.add(i, image)
+    whites = exposure.whites()
+    self.assertEqual(sorted(whites), list(range(20)))
+    whites = np.array([whites[i] for i in range(20)])
+    # The firefly covers less than 0.1% of the image.
+    self.assertTrue(np.allclose(whites, 0.5, rtol=0.05))
+
+  def test_clip_exposure_smoothing(self):
+    exposure = tonemap.ClipExposure(window=5, percentile=50)
+    for i in range(20):
+      exposure.add(i, np.full((4, 4, 3), 1.0 + i % 2, dtype=np.float32))
+    whites = exposure.whites()
+    raw = [0.5, 2 / 3]
+    for i in range(2, 18):
+      self.assertLess(abs(whites[i] - whites[i + 1]),
+                      (raw[1] - raw[0]) / 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
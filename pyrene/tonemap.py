@@ -0,0 +1,118 @@
+import numpy as np
+import threading
+
+try:
+  import imageio.v2 as imageio
+except ImportError:
+  import imageio
+
+try:
+  import Imath
+  import OpenEXR
+except ImportError:
+  OpenEXR = None
+
+
+_LUMINANCE = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+def read_exr(path):
+  if OpenEXR is None:
+    # Falls back to imageio, which needs its FreeImage plugin for EXR.
+    return np.asarray(imageio.imread(path), dtype=np.float32)[:, :, :3]
+  exr = OpenEXR.InputFile(path)
+  try:
+    window = exr.header()['dataWindow']
+    width = window.max.x - window.min.x + 1
+    height = window.max.y - window.min.y + 1
+    pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+    image = np.empty((height, width, 3), dtype=np.float32)
+    for i, channel in enumerate(exr.channels('RGB', pixel_type)):
+      image[:, :, i] = np.frombuffer(channel, dtype=np.float32).reshape(
+          height, width)
+  finally:
+    exr.close()
+  return image
+
+
+def write_exr(path, image):
+  assert OpenEXR is not None, 'Writing EXR files requires OpenEXR'
+  height, width = image.shape[:2]
+  exr = OpenEXR.OutputFile(path, OpenEXR.Header(width, height))
+  image = np.asarray(image, dtype=np.float32)
+  exr.writePixels({c: np.ascontiguousarray(image[:, :, i]).tobytes()
+                   for i, c in enumerate('RGB')})
+  exr.close()
+
+
+def luminance(image):
+  return image.dot(_LUMINANCE)
+
+
+def tonemap(image, scale=1.0):
+  # Global Reinhard operator on luminance, keeping the chromaticity.
+  image = image * np.float32(scale)
+  lum = luminance(image)
+  image *= (1 / (1 + lum))[:, :, np.newaxis]
+  return image
+
+
+def normalize(image, white=None):
+  if white is None:
+    white = image.max()
+  if white > 0:
+    image *= np.float32(1 / white)
+  return image
+
+
+def quantize(image):
+  # Linear [0, 1] to 8-bit sRGB.
+  image = np.clip(image, 0, 1)
+  image = np.where(image <= 0.0031308, 12.92 * image,
+                   1.055 * np.power(image, 1 / 2.4) - 0.055)
+  return (image * 255 + 0.5).astype(np.uint8)
+
+
+def postprocess(exr_file, output_file=None, scale=1.0, white=None):
+  image = quantize(normalize(tonemap(read_exr(exr_file), scale), white))
+  if output_file is not None:
+    imageio.imwrite(output_file, image)
+  return image
+
+
+class ClipExposure(object):
+  # Chooses white points for a whole clip so that brightness doesn't flicker
+  # from frame to frame. Each frame contributes a histogram of its tonemapped
+  # values as it is rendered, and only the resulting percentile is kept, so
+  # the frames never need to be in memory together.
+
+  def __init__(self, percentile=99.9, window=15, bins=1024, scale=1.0):
+    self.percentile = percentile
+    self.window = window
+    self.scale = scale
+    self.edges = np.logspace(-6, 2, bins + 1)
+    self._log_whites = {}
+    self._lock = threading.Lock()
+
+  def add(self, index, image):
+    values = tonemap(image, self.scale).max(axis=2)
+    values = np.clip(values, self.edges[0], self.edges[-1])
+    hist, _ = np.histogram(values, bins=self.edges)
+    cdf = np.cumsum(hist)
+    i = np.searchsorted(cdf, cdf[-1] * self.percentile / 100)
+    with self._lock:
+      self._log_whites[index] = np.log(self.edges[i + 1])
+
+  def whites(self):
+    # Moving average of log white points, centered on each frame and
+    # shrinking at the ends of the clip.
+    with self._lock:
+      indices = sorted(self._log_whites)
+      log_whites = np.array([self._log_whites[i] for i in indices])
+    n = len(indices)
+    half = self.window // 2
+    sums = np.concatenate([[0], np.cumsum(log_whites)])
+    lo = np.maximum(np.arange(n) - half, 0)
+    hi = np.minimum(np.arange(n) + half + 1, n)
+    smoothed = np.exp((sums[hi] - sums[lo]) / (hi - lo))
+    return dict(zip(indices, smoothed))